@@ -1,10 +1,15 @@
 from dataclasses import dataclass
 from datetime import datetime, timezone, timedelta
-from api.tinvest.utils import infer_start_and_end_date
-from api.tinvest.constants import working_hours, break_in_working_hours, working_weekends, session_type
 from api.tinvest.datatypes import SessionAuction, InstrumentType
+from api.broker_list import t_invest
 from engine.schemas.enums import SessionPeriod
-from engine.schemas.datatypes import Period
+from engine.schemas.datatypes import Period, ExchangeCalendar, get_exchange_calendar
+
+calendar_auctions = {
+    ExchangeCalendar.NO_AUCTION: SessionAuction.TWOSIDED,
+    ExchangeCalendar.OPENING: SessionAuction.OPENING,
+    ExchangeCalendar.CLOSING: SessionAuction.CLOSING,
+}
 
 
 @dataclass
@@ -27,33 +32,32 @@ class TPeriod(Period):
         self.update_market_schedule_info()
 
     def update_market_schedule_info(self):
-        if self.time_period.weekday() >= 5 and self.time_period.date() not in working_weekends:
-            self.instrument_session = {type_instrument: SessionPeriod.CLOSED for type_instrument in InstrumentType}
-            self.instrument_auction = {type_instrument: SessionAuction.CLOSED for type_instrument in InstrumentType}
-        else:
-            for type_instrument in InstrumentType:
-                self.exchange_closed, self.on_break = False, False
-
-                # checking whether the exchange is open
-                if not working_hours.is_datetime_in_relevant_interval(type_instrument, self.time_period):
-                    self.exchange_closed = True
-
-                # checking whether there is a break in trading the instrument
-                if break_in_working_hours.is_datetime_in_relevant_interval(type_instrument, self.time_period):
-                    self.on_break = True
-
-                if self.on_break or self.exchange_closed:
-                    self.instrument_session[type_instrument] = SessionPeriod.CLOSED
-                    self.instrument_auction[type_instrument] = SessionAuction.CLOSED
-                else:
-                    self.instrument_session[type_instrument], session_metainfo = (
-                        session_type.items_of_relevant_interval(type_instrument, self.time_period))
-
-                    session_start_date, session_end_date = infer_start_and_end_date(self.time_period, session_metainfo)
-
-                    if session_metainfo['opening'] and session_start_date == self.time_period:
-                        self.instrument_auction[type_instrument] = SessionAuction.OPENING
-                    elif session_metainfo['closing'] and session_end_date == self.time_period:
-                        self.instrument_auction[type_instrument] = SessionAuction.CLOSING
-                    else:
-                        self.instrument_auction[type_instrument] = SessionAuction.TWOSIDED
+        self.exchange_closed, self.on_break = True, False
+
+        for type_instrument in InstrumentType:
+            session, auction = get_exchange_calendar(t_invest, type_instrument).session(self.time_period)
+
+            self.instrument_session[type_instrument] = session
+
+            if session == SessionPeriod.CLOSED:
+                self.instrument_auction[type_instrument] = SessionAuction.CLOSED
+            else:
+                self.instrument_auction[type_instrument] = calendar_auctions[auction]
+                self.exchange_closed = False
+
+    def skip_closed_periods(self, types_instruments):
+        if any(self.instrument_session[type_instrument] != SessionPeriod.CLOSED
+               for type_instrument in types_instruments):
+            return
+
+        next_open_periods = [
+            get_exchange_calendar(t_invest, type_instrument).next_open(self.time_period)
+            for type_instrument in types_instruments
+        ]
+        next_open_periods = [period for period in next_open_periods if period is not None]
+
+        if len(next_open_periods) == 0:
+            raise StopIteration
+
+        self.time_period = max(self.time_period, min(next_open_periods))
+        self.update_market_schedule_info()
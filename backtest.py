@@ -1,13 +1,17 @@
 from datetime import datetime, timezone, timedelta
 from api.broker_list import t_invest
 from api.tinvest.tticker import TTicker
+from api.tinvest.mock_client import TMockClient
 from engine.candles.candles_uploader import LocalTSUploader
-from engine.schemas.constants import model_path
+from engine.schemas.constants import model_path, cache_path
 
 from main import main
 from engine.strategies.state_based import AvgState
+from engine.strategies.vectorized import VectorizedAvgState
+from engine.walk_forward import predict_states
 
-from engine.schemas.pipeline import Pipeline
+from engine.schemas.pipeline import TSPipeline, DataNode, DataNodeUnion
+from engine.schemas.datanode_cache import DataNodeCache
 
 from sklearn.linear_model import LogisticRegression
 from sklearn.preprocessing import StandardScaler, OneHotEncoder
@@ -21,7 +25,9 @@ set_config(transform_output="pandas")
 LocalTSUploader.broker = t_invest
 
 train_model = False
+cache_features = True
 backtest_model = True
+vectorized_backtest = False
 
 
 if __name__ == '__main__':
@@ -31,6 +37,10 @@ if __name__ == '__main__':
     path_to_model = model_path + t_invest.broker_name + f'/{ticker}/LogisticReg(return_lag=5)/'
 
     if train_model:
+        # features of a rerun are read from the cache, only the candles past the last run are computed
+        if cache_features:
+            DataNode.cache = DataNodeCache(cache_path)
+
         lags = 20
         waiting_period = 5
 
@@ -53,50 +63,45 @@ if __name__ == '__main__':
             classes_name={0: 'calm', 1: 'bull', 2: 'bear'}
         )
 
-        pipe2 = Pipeline(TTicker("SBER"), end_date=train_date).add_nodes(
-            [RemoveZeroActivityCandles(),
-             CandlesToDirection(periods=waiting_period)
-             ]
-        )
-
-        pipe_onehot = Pipeline(TTicker("SBER"), end_date=train_date).add_nodes(
-            [RemoveZeroActivityCandles(),
-             CandlesToDirection(periods=waiting_period),
-             OneHotEncoder(sparse_output=False),
-             ],
-            add_prefix='onehot_'
+        features = DataNodeUnion(
+            TTicker("SBER"),
+            chains=[
+                [RemoveZeroActivityCandles(),
+                 Returns(keep_overnight=False, day_number=False, candle_to_price='close', keep_vol=False),
+                 StandardScaler(with_mean=False)],
+                [RemoveZeroActivityCandles(),
+                 CandlesToDirection(periods=waiting_period)],
+                [RemoveZeroActivityCandles(),
+                 CandlesToDirection(periods=waiting_period),
+                 OneHotEncoder(sparse_output=False)],
+            ],
+            prefixes=[None, None, 'onehot_']
         )
 
-        pipe1 = Pipeline(TTicker("SBER"), end_date=train_date).add_nodes(
-            [RemoveZeroActivityCandles(),
-             Returns(keep_overnight=False, day_number=False, candle_to_price='close', keep_vol=False),
-             StandardScaler(with_mean=False),
-             model
-             ]
-        )
+        candles = TMockClient.load_candles(TTicker("SBER"), end=train_date)
 
-        pipe1.union(pipe2)
-        pipe1.union(pipe_onehot)
-
-        print(pipe1._compute_X())
-
-        fitted_model = pipe1.fit()
+        # the snapshot holds the fitted features along with the model, so it predicts from raw candles
+        fitted_model = TSPipeline([('features', features), ('model', model)], fit_date=candles.index[-1])
+        fitted_model.fit(candles)
 
         fitted_model.save(path_to_model)
 
-    if backtest_model:
-        duration = timedelta(hours=24)
-
-        mock_client_config = {
-            'period': train_date + timedelta(minutes=1),
-            'bid_orderbook_price': 'open',
-            'ask_orderbook_price': 'open',
-            'market_order_price': 'open',
-            'buy_price_end_period': 'low',
-            'sell_price_end_period': 'high',
-            'lag_in_cached_candles': 1,
-        }
+    duration = timedelta(hours=24)
+
+    mock_client_config = {
+        'period': train_date + timedelta(minutes=1),
+        'bid_orderbook_price': 'open',
+        'ask_orderbook_price': 'open',
+        'market_order_price': 'open',
+        'buy_price_end_period': 'low',
+        'sell_price_end_period': 'high',
+        'lag_in_cached_candles': 1,
+        'skip_closed_periods': True,
+        'end_period': train_date + timedelta(minutes=1) + duration,
+        'history': timedelta(weeks=1),
+    }
 
+    if backtest_model:
         strategies = [
             AvgState(
                 path_to_model=path_to_model,
@@ -115,3 +120,23 @@ if __name__ == '__main__':
             duration=duration,
         )
 
+    if vectorized_backtest:
+        ticker = TTicker(tickers_collection[0])
+        candles = TMockClient.load_candles(
+            ticker,
+            start=mock_client_config['period'] - mock_client_config['history'],
+            end=mock_client_config['end_period']
+        )
+        start = (candles.index <= mock_client_config['period']).argmin() - 1
+        candles = candles.iloc[start:]
+
+        states = predict_states(TSPipeline(path=path_to_model, train_split_date=train_date), candles)
+
+        vectorized_strategy = VectorizedAvgState(
+            client_constructor=TMockClient,
+            client_config=mock_client_config,
+            cash_share=0.9,
+        )
+
+        print(vectorized_strategy.run(ticker, candles, states))
+        print(vectorized_strategy.cash, sum(vectorized_strategy.profits))
@@ -0,0 +1,165 @@
+from engine.models.target_processor import TargetProcessorClassifier
+from engine.schemas.datatypes import ExchangeIntervalTree
+from api.tinvest.constants import working_hours, break_in_working_hours, session_type, start_date
+from api.tinvest.datatypes import InstrumentType
+from sklearn.linear_model import LogisticRegression
+from time import perf_counter
+import pandas as pd
+import numpy as np
+import sys
+from copy import deepcopy
+from datetime import date, timedelta
+
+
+# synthetic minute features shaped like the inputs of the LogisticReg model of backtest.py
+def make_features(n_rows: int, waiting_period: int = 5, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+
+    X = pd.DataFrame(
+        {'returns': rng.standard_normal(n_rows)},
+        index=pd.date_range('2023-01-03 07:00', periods=n_rows, freq='min', tz='UTC')
+    )
+    direction = rng.integers(0, 3, n_rows)
+
+    for i in range(3):
+        X[f'onehot_direction_{waiting_period}_{i}'] = (direction == i).astype(np.float64)
+
+    X[f'direction_{waiting_period}'] = direction
+
+    return X
+
+
+def make_model(lags: int, waiting_period: int = 5) -> TargetProcessorClassifier:
+    columns = ['returns'] + [f'onehot_direction_{waiting_period}_{i}' for i in range(3)]
+
+    return TargetProcessorClassifier(
+        target_name=f'direction_{waiting_period}',
+        estimator=LogisticRegression(tol=0.001, C=0.5, max_iter=20),
+        max_lag_columns={column: lags + waiting_period for column in columns},
+        min_lag_columns={column: waiting_period for column in columns},
+        remainder='drop',
+        classes_name={0: 'calm', 1: 'bull', 2: 'bear'}
+    )
+
+
+def timeit(f, repeat: int) -> float:
+    times = []
+
+    for _ in range(repeat):
+        start = perf_counter()
+        f()
+        times.append(perf_counter() - start)
+
+    return min(times)
+
+
+def benchmark_lag_matrix(repeat: int = 5):
+    print('TargetProcessor._transform (lag matrix)')
+
+    for n_rows in [10_000, 100_000, 500_000]:
+        X = make_features(n_rows)
+
+        for lags in [5, 20, 60]:
+            model = make_model(lags)
+            seconds = timeit(lambda: model._transform(X), repeat)
+            design, _ = model._transform(X)
+
+            print(f'  rows={n_rows:>7} lags={lags:>3} features={design.shape[1]:>3}: {seconds * 1e3:9.2f} ms')
+
+
+def benchmark_online_predict(n_ticks: int = 1000):
+    print('TargetProcessorClassifier, latency per 1-minute tick')
+
+    X = make_features(50_000)
+    train, test = X.iloc[:-n_ticks], X.iloc[-n_ticks:]
+
+    for lags in [5, 20, 60]:
+        model = make_model(lags).fit(train)
+        batch_model = deepcopy(model)
+        rows = test.to_dict('records')
+
+        start = perf_counter()
+        for row in rows:
+            model.update(row)
+        online = (perf_counter() - start) / n_ticks
+
+        start = perf_counter()
+        for i in range(n_ticks):
+            batch_model.predict(test.iloc[i:i + 1])
+        batch = (perf_counter() - start) / n_ticks
+
+        x = np.zeros((1, len(model._buffer_lags)))
+        start = perf_counter()
+        for _ in range(n_ticks):
+            model.estimator.predict(x)
+        estimator = (perf_counter() - start) / n_ticks
+
+        print(f'  lags={lags:>3}: update {online * 1e6:8.1f} us, predict {batch * 1e6:8.1f} us, '
+              f'of which estimator.predict {estimator * 1e6:6.1f} us')
+
+
+# the linear scan fetch_info was before bisection and memoization, kept to compare against
+def linear_fetch_info(tree: ExchangeIntervalTree, type_instrument: InstrumentType, date_query: date):
+    for date_key_l, date_key_r in zip(list(tree.time_info[type_instrument].keys())[:-1],
+                                      list(tree.time_info[type_instrument].keys())[1:]):
+        if date_key_l <= date_query < date_key_r:
+            if tree.time_info[type_instrument][date_key_l] is not None:
+                return tree.time_info[type_instrument][date_key_l]
+
+
+def benchmark_fetch_info(n_passes: int = 20, repeat: int = 3):
+    print('ExchangeDateTimeInfo.fetch_info, calls per second on every date of the schedules')
+
+    n_days = (date.today() - start_date).days
+    queries = [start_date + timedelta(days=int(day)) for day in np.random.default_rng(0).permutation(n_days)]
+    n_queries = n_passes * n_days
+
+    for name, tree in [
+        ('working_hours', working_hours),
+        ('break_in_working_hours', break_in_working_hours),
+        ('session_type', session_type),
+    ]:
+        for query in queries:
+            assert tree.fetch_info(InstrumentType.STOCK, query) == linear_fetch_info(tree, InstrumentType.STOCK, query)
+
+        def linear():
+            for _ in range(n_passes):
+                for query in queries:
+                    linear_fetch_info(tree, InstrumentType.STOCK, query)
+
+        # every date is queried once per copy of the tree, and a copy starts with nothing memoized,
+        # so every call bisects
+        bisection_times = []
+
+        for _ in range(repeat):
+            copies = [ExchangeIntervalTree(deepcopy(tree.time_info)) for _ in range(n_passes)]
+
+            start = perf_counter()
+            for tree_copy in copies:
+                for query in queries:
+                    tree_copy.fetch_info(InstrumentType.STOCK, query)
+            bisection_times.append(perf_counter() - start)
+
+        def memoized():
+            for _ in range(n_passes):
+                for query in queries:
+                    tree.fetch_info(InstrumentType.STOCK, query)
+
+        linear_rate = n_queries / timeit(linear, repeat)
+        bisection_rate = n_queries / min(bisection_times)
+        memoized_rate = n_queries / timeit(memoized, repeat)
+
+        print(f'  {name:>22}: linear {linear_rate:12,.0f} calls/s, bisection {bisection_rate:12,.0f} calls/s '
+              f'({bisection_rate / linear_rate:4.1f}x), memoized {memoized_rate:12,.0f} calls/s '
+              f'({memoized_rate / linear_rate:4.1f}x)')
+
+
+if __name__ == '__main__':
+    benchmarks = {
+        'lag_matrix': benchmark_lag_matrix,
+        'online_predict': benchmark_online_predict,
+        'fetch_info': benchmark_fetch_info,
+    }
+
+    for name in sys.argv[1:] if len(sys.argv) > 1 else benchmarks.keys():
+        benchmarks[name]()
@@ -1,9 +1,33 @@
 import pandas as pd
+import numpy as np
+import json
 import os
+from glob import glob
+from bisect import bisect_left, bisect_right
+from datetime import datetime
 from typing import Union
+from engine.schemas.constants import data_path
+from engine.schemas.datatypes import Broker, Ticker
+
+# dtypes of the columns of the columnar storage, unknown columns are stored as float64
+candle_dtypes = {
+    'open': np.float64,
+    'high': np.float64,
+    'low': np.float64,
+    'close': np.float64,
+    'volume': np.int64,
+    'day_number': np.int64,
+}
 
 
 class LocalTSUploader:
+    # candles of the traded tickers shared by the client, the strategies and the data nodes of a process
+    broker: Broker = None
+    candles_in_memory: dict[Ticker, pd.DataFrame] = {}
+    last_candles: dict[Ticker, pd.DataFrame] = {}
+    candles_start_dates: dict[Ticker, datetime] = {}
+    new_candles: dict[Ticker, list[pd.DataFrame]] = {}
+
     def __init__(self, path: str):
         self.new_observations: list[pd.DataFrame] = []
         self.path = path
@@ -75,3 +99,283 @@ class LocalTSUploader:
 
         self.new_observations = []
 
+
+
+class ColumnarTSUploader(LocalTSUploader):
+    """
+    Uploader of time-series stored in a columnar binary format.
+
+    The self.path is a directory holding one raw binary file per column, a 'time' file
+    with int64 minutes since the epoch (UTC) and a 'columns.json' file with the dtypes of the columns.
+    Loading is a plain read of typed arrays, no parsing of text is involved.
+    """
+    schema_file = 'columns.json'
+    time_file = 'time.bin'
+
+    def _column_file(self, column: str) -> str:
+        return os.path.join(self.path, f'{column}.bin')
+
+    def _read_schema(self) -> dict[str, np.dtype]:
+        with open(os.path.join(self.path, self.schema_file)) as schema:
+            return {column: np.dtype(dtype) for column, dtype in json.load(schema).items()}
+
+    def _write_schema(self, schema: dict[str, np.dtype]):
+        with open(os.path.join(self.path, self.schema_file), 'w') as schema_file:
+            json.dump({column: np.dtype(dtype).name for column, dtype in schema.items()}, schema_file)
+
+    @staticmethod
+    def _to_columns(ts: pd.DataFrame) -> tuple[np.ndarray, dict[str, np.ndarray]]:
+        if 'time' in ts.columns:
+            times = ts['time']
+            ts = ts.drop(columns='time')
+        elif ts.index.name == 'time':
+            times = ts.index.to_series()
+        else:
+            raise ValueError('Time-series must have \'time\' column.')
+
+        minutes = ColumnarTSUploader.to_minutes(times)
+        columns = {
+            column: ts[column].to_numpy(dtype=candle_dtypes.get(column, np.float64))
+            for column in ts.columns
+        }
+
+        return minutes, columns
+
+    @staticmethod
+    def to_minutes(times) -> np.ndarray:
+        times = pd.to_datetime(pd.Series(times), utc=True)
+
+        return ((times - pd.Timestamp(0, tz='UTC')) // pd.Timedelta(minutes=1)).to_numpy(dtype=np.int64)
+
+    @staticmethod
+    def minutes_to_index(minutes: np.ndarray) -> pd.DatetimeIndex:
+        return pd.DatetimeIndex(pd.to_datetime(minutes * 60, unit='s', utc=True), name='time')
+
+    def upload_ts(self, ts: pd.DataFrame):
+        """
+        Uploads time-series ts.
+
+        Overwrites the columnar storage at the self.path with the ts dataframe. Time-series ts must have
+        a 'time' column or a 'time' index.
+        """
+        minutes, columns = self._to_columns(ts)
+
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path)
+
+        self._write_schema({column: values.dtype for column, values in columns.items()})
+        minutes.tofile(os.path.join(self.path, self.time_file))
+
+        for column, values in columns.items():
+            values.tofile(self._column_file(column))
+
+    def read_minutes(self) -> np.ndarray:
+        return np.fromfile(os.path.join(self.path, self.time_file), dtype=np.int64)
+
+    def download_ts(self):
+        """
+        Download cached time-series.
+
+        Returns the dataframe of a time-series saved at the self.path. Index of a returned df is a 'time' column.
+        """
+        minutes = self.read_minutes()
+
+        return pd.DataFrame(
+            {column: np.fromfile(self._column_file(column), dtype=dtype)
+             for column, dtype in self._read_schema().items()},
+            index=self.minutes_to_index(minutes)
+        )
+
+    def memmap_ts(self) -> pd.DataFrame:
+        """
+        Memory-map cached time-series.
+
+        Returns the dataframe of a time-series saved at the self.path whose columns are read-only views
+        of the memory-mapped column files. Processes mapping the same files share pages through the OS cache,
+        and row slices of the returned dataframe stay views. Only the 'time' index is built in memory.
+        """
+        minutes = self.read_minutes()
+
+        return pd.DataFrame(
+            {column: self._memmap_column(column, dtype, len(minutes))
+             for column, dtype in self._read_schema().items()},
+            index=self.minutes_to_index(minutes),
+            copy=False
+        )
+
+    def _memmap_column(self, column: str, dtype: np.dtype, length: int) -> np.ndarray:
+        # numpy refuses to map empty files
+        if length == 0:
+            return np.empty(0, dtype=dtype)
+
+        return np.memmap(self._column_file(column), dtype=dtype, mode='r', shape=(length,))
+
+    def upload_new_observations(self):
+        """
+        Uploads new observations.
+
+        Appends new observations at the end of the column files at self.path.
+        """
+        if len(self.new_observations) > 0:
+            if not os.path.isfile(os.path.join(self.path, self.schema_file)):
+                self.upload_ts(pd.concat(self.new_observations))
+            else:
+                minutes, columns = self._to_columns(pd.concat(self.new_observations))
+                schema = self._read_schema()
+
+                if set(schema.keys()) != set(columns.keys()):
+                    raise ValueError(f'New observations must have columns {list(schema.keys())}.')
+
+                with open(os.path.join(self.path, self.time_file), 'ab') as f:
+                    minutes.tofile(f)
+
+                for column, dtype in schema.items():
+                    with open(self._column_file(column), 'ab') as f:
+                        columns[column].astype(dtype, copy=False).tofile(f)
+
+        self.new_observations = []
+
+
+class PartitionedCandlesStore:
+    """
+    Candle store partitioned by months.
+
+    Candles of a ticker are kept at <path>/<broker>/<ticker>/<freq_name>_monthly/ as one ColumnarTSUploader
+    directory per month (e.g. '2024-12') and a 'partitions.json' index holding the first and the last minute
+    of every partition. Range queries only map the partitions overlapping the requested range.
+    """
+    index_file = 'partitions.json'
+    # whole columnar candles of tickers not in the store, mapped once per process
+    columnar_cache: dict[str, pd.DataFrame] = {}
+
+    def __init__(self, broker: Broker, path: str = data_path, freq_name: str = 'candles_1min'):
+        self.broker = broker
+        self.path = path
+        self.freq_name = freq_name
+
+    def _ticker_path(self, ticker: Ticker) -> str:
+        return self.path + f'{self.broker.broker_name}/{ticker.ticker_sign}/{self.freq_name}_monthly/'
+
+    def partitions(self, ticker: Ticker) -> list[list]:
+        """
+        Returns the index of partitions.
+
+        Returns the list of [partition name, first minute, last minute] sorted by time,
+        minutes are counted since the epoch. Returns an empty list if nothing is stored for the ticker.
+        """
+        path_to_index = self._ticker_path(ticker) + self.index_file
+
+        if not os.path.isfile(path_to_index):
+            return []
+
+        with open(path_to_index) as index:
+            return json.load(index)
+
+    def append(self, ticker: Ticker, ts: pd.DataFrame):
+        """
+        Appends candles.
+
+        Splits ts by months and appends every part to its partition. Candles of ts must be newer
+        than the stored ones.
+        """
+        if len(ts) == 0:
+            return
+
+        minutes = ColumnarTSUploader.to_minutes(ts['time'] if 'time' in ts.columns else ts.index)
+        partitions = self.partitions(ticker)
+
+        if len(partitions) > 0 and minutes[0] <= partitions[-1][2]:
+            raise ValueError('New candles must be newer than the stored ones.')
+
+        months = ColumnarTSUploader.minutes_to_index(minutes).strftime('%Y-%m').to_numpy()
+        month_starts = np.flatnonzero(np.r_[True, months[1:] != months[:-1]])
+
+        for start, end in zip(month_starts, np.r_[month_starts[1:], len(months)]):
+            uploader = ColumnarTSUploader(self._ticker_path(ticker) + months[start])
+            uploader.save_new_observations(ts.iloc[start:end])
+            uploader.upload_new_observations()
+
+            if len(partitions) > 0 and partitions[-1][0] == months[start]:
+                partitions[-1][2] = int(minutes[end - 1])
+            else:
+                partitions.append([months[start], int(minutes[start]), int(minutes[end - 1])])
+
+        with open(self._ticker_path(ticker) + self.index_file, 'w') as index:
+            json.dump(partitions, index)
+
+    def read_range(self, ticker: Ticker, start: datetime = None, end: datetime = None) -> pd.DataFrame:
+        """
+        Reads candles in a range of dates.
+
+        Returns candles with start <= time <= end, None stands for an unbounded side of the range.
+        Index of a returned df is a 'time' column.
+        """
+        partitions = self.partitions(ticker)
+        start_minute = -np.inf if start is None else ColumnarTSUploader.to_minutes([start])[0]
+        end_minute = np.inf if end is None else ColumnarTSUploader.to_minutes([end])[0]
+
+        first = bisect_left([partition[2] for partition in partitions], start_minute)
+        last = bisect_right([partition[1] for partition in partitions], end_minute)
+
+        start = None if start is None else pd.to_datetime(start, utc=True)
+        end = None if end is None else pd.to_datetime(end, utc=True)
+
+        candles = []
+
+        for name, _, _ in partitions[first:last]:
+            partition = ColumnarTSUploader(self._ticker_path(ticker) + name).memmap_ts()
+
+            candles.append(partition.iloc[
+                0 if start is None else partition.index.searchsorted(start, side='left'):
+                len(partition) if end is None else partition.index.searchsorted(end, side='right')
+            ])
+
+        if len(candles) == 0:
+            schema = candle_dtypes if len(partitions) == 0 else \
+                ColumnarTSUploader(self._ticker_path(ticker) + partitions[0][0])._read_schema()
+
+            return pd.DataFrame(
+                {column: np.empty(0, dtype=dtype) for column, dtype in schema.items()},
+                index=ColumnarTSUploader.minutes_to_index(np.empty(0, dtype=np.int64))
+            )
+
+        return pd.concat(candles)
+
+    def memmap_columnar(self, ticker_sign: str) -> pd.DataFrame:
+        path = self.path + f'{self.broker.broker_name}/{ticker_sign}/{self.freq_name}'
+
+        if path not in self.columnar_cache:
+            self.columnar_cache[path] = ColumnarTSUploader(path).memmap_ts()
+
+        return self.columnar_cache[path]
+
+    def read_candles(self, ticker: Ticker, start: datetime = None, end: datetime = None) -> pd.DataFrame:
+        """
+        Reads candles in a range of dates, from the store or from the columnar candles of the ticker.
+
+        Tickers not migrated to the store are read from their whole columnar candles, which are mapped
+        once per process. Returns candles with start <= time <= end like read_range.
+        """
+        if len(self.partitions(ticker)) > 0:
+            return self.read_range(ticker, start, end)
+
+        return self.memmap_columnar(ticker.ticker_sign).loc[start:end]
+
+
+def migrate_csv_candles(path: str = data_path) -> list[str]:
+    """
+    Migrates .csv candles to the columnar storage.
+
+    Converts every data/<broker>/<ticker>/candles_<n>min.csv file found under the path into
+    a ColumnarTSUploader directory of the same name without the .csv extension. Returns the list of
+    created directories. The .csv files are left intact.
+    """
+    migrated = []
+
+    for path_to_csv in sorted(glob(os.path.join(path, '*', '*', 'candles_*min.csv'))):
+        columnar_path = path_to_csv[:-len('.csv')]
+
+        ColumnarTSUploader(columnar_path).upload_ts(LocalTSUploader(path_to_csv).download_ts())
+        migrated.append(columnar_path)
+
+    return migrated
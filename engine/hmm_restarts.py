@@ -0,0 +1,131 @@
+import pandas as pd
+import numpy as np
+import os
+from time import time
+from copy import deepcopy
+from concurrent.futures import ProcessPoolExecutor
+
+_X = None
+
+
+# the training data is sent once per worker process instead of once per restart
+def _init_worker(X):
+    global _X
+    _X = X
+
+
+def _fit_restart(model, n_components: int, seed: int) -> tuple[dict, object]:
+    start = time()
+    model = deepcopy(model)
+
+    if hasattr(model, 'name'):
+        model.name = model.name.replace(f'n_components={model.n_components}', f'n_components={n_components}')
+
+    model.n_components = n_components
+    model.random_state = seed
+
+    # every restart is a single try from its own seed, a failed one is reported instead of retried
+    if hasattr(model, 'n_tries'):
+        model.n_tries = 1
+
+    diagnostics = {'n_components': n_components, 'seed': seed}
+
+    try:
+        model.fit(_X)
+
+        diagnostics |= {
+            'score': model.score(_X),
+            'aic': model.aic(_X),
+            'bic': model.bic(_X),
+            'converged': model.monitor_.converged,
+            'n_iter': len(model.monitor_.history),
+            'error': None,
+        }
+    except Exception as e:
+        diagnostics |= {'score': np.nan, 'aic': np.nan, 'bic': np.nan, 'converged': False, 'n_iter': 0, 'error': repr(e)}
+        model = None
+
+    diagnostics['seconds'] = round(time() - start, 3)
+
+    return diagnostics, model
+
+
+class HMMRestarts:
+    """Fits an hmmlearn model from several random initializations and keeps the best fit.
+
+    Every number of states in n_components is fitted n_restarts times, with distinct seeds drawn from
+    seed, in a pool of worker processes, one per core by default. Each restart fits once: models that
+    retry failed fits, like HMMLearnGaussian, are set to a single try. Fits are compared by criterion:
+    the highest 'score' (log-likelihood) or the lowest 'aic' or 'bic'. Only the latter compare fits
+    with different numbers of states meaningfully.
+
+    After fit, results_ holds the diagnostics of every restart (criteria, convergence, number of EM
+    iterations, time, error of the failed ones), best_models_ the best model of every number of states
+    and best_model_ the best of them.
+    """
+
+    criteria = ('score', 'aic', 'bic')
+
+    def __init__(
+            self,
+            model,
+            n_restarts: int = 10,
+            n_components: list[int] = None,
+            criterion: str = 'score',
+            seed: int = 0,
+            n_jobs: int = None,
+    ):
+        if criterion not in self.criteria:
+            raise ValueError(f'criterion must be one of {self.criteria}, got {criterion}.')
+
+        self.model = model
+        self.n_restarts = n_restarts
+        self.n_components = n_components if n_components is not None else [model.n_components]
+        self.criterion = criterion
+        self.seed = seed
+        self.n_jobs = n_jobs if n_jobs is not None else os.cpu_count()
+
+        self.results_: pd.DataFrame = None
+        self.best_models_: dict = None
+        self.best_model_ = None
+
+    def seeds(self) -> list[int]:
+        return [int(seed) for seed in np.random.SeedSequence(self.seed).generate_state(self.n_restarts)]
+
+    def fit(self, X: pd.DataFrame):
+        tasks = [(n_components, seed) for n_components in self.n_components for seed in self.seeds()]
+
+        with ProcessPoolExecutor(
+                max_workers=min(self.n_jobs, len(tasks)),
+                initializer=_init_worker,
+                initargs=(X,)
+        ) as executor:
+            fits = list(executor.map(
+                _fit_restart,
+                [self.model] * len(tasks),
+                [n_components for n_components, _ in tasks],
+                [seed for _, seed in tasks],
+            ))
+
+        self.results_ = pd.DataFrame([diagnostics for diagnostics, _ in fits])
+
+        # scores are maximized, information criteria minimized
+        sign = -1 if self.criterion == 'score' else 1
+        values = sign * self.results_[self.criterion].to_numpy()
+
+        self.best_models_ = {}
+        best = {}
+
+        for idx, ((n_components, _), (_, model)) in enumerate(zip(tasks, fits)):
+            if model is not None and (n_components not in best or values[idx] < values[best[n_components]]):
+                self.best_models_[n_components] = model
+                best[n_components] = idx
+
+        if len(best) == 0:
+            raise ValueError(f'All {len(tasks)} restarts failed: {self.results_["error"].unique()}')
+
+        self.results_['best'] = self.results_.index.isin(best.values())
+
+        self.best_model_ = self.best_models_[min(best, key=lambda n_components: values[best[n_components]])]
+
+        return self.best_model_
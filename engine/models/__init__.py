@@ -1 +1 @@
-from .har import HAR_RV
\ No newline at end of file
+from .har import HAR_RV, HAR_RVPanel
\ No newline at end of file
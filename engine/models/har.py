@@ -6,19 +6,65 @@ import statsmodels.api as sm
 from dataclasses import dataclass
 
 
+class RLS:
+    """Recursive least squares over a window of rows.
+
+    Keeps the inverse P of X'X and the OLS coefficients of the rows in the window. Adding a row with
+    update or removing one with downdate is a Sherman-Morrison rank-one correction of P, so moving the
+    window by a row costs O(k^2) for k regressors instead of the O(n*k^2) of solving it again.
+    """
+
+    def __init__(self, x: np.ndarray, y: np.ndarray):
+        self.fit(x, y)
+
+    def fit(self, x: np.ndarray, y: np.ndarray):
+        y = y.reshape(y.shape[0], -1)
+
+        self.P = np.linalg.inv(x.T @ x)
+        self.beta = self.P @ x.T @ y
+
+        return self
+
+    def update(self, x: np.ndarray, y):
+        Px = self.P @ x
+        gain = Px / (1 + x @ Px)
+
+        self.beta += np.outer(gain, np.ravel(y) - x @ self.beta)
+        self.P -= np.outer(gain, Px)
+
+    def downdate(self, x: np.ndarray, y):
+        Px = self.P @ x
+        gain = Px / (1 - x @ Px)
+
+        self.beta -= np.outer(gain, np.ravel(y) - x @ self.beta)
+        self.P += np.outer(gain, Px)
+
+    def predict(self, x: np.ndarray) -> np.ndarray:
+        return x @ self.beta
+
+
+# one-step forecasts of y[idxSplit:], each from the OLS fit on the rows before it: all of them if recursive,
+# the last idxSplit of them otherwise; the rolling fit is solved again once per window length to bound
+# the rounding errors accumulated by the downdates
 def calculateLosses(x, y, idxSplit, recursive=True) -> np.array:
     predicts = []
     idxRoll = 0
+    rls = RLS(x[:idxSplit], y[:idxSplit])
 
     for idx in range(idxSplit, x.shape[0]):
-        beta = np.linalg.inv(x[idxRoll:idx].T @ x[idxRoll:idx]) @ x[idxRoll:idx].T @ y[idxRoll:idx]
-        predict = (x[idx, :] @ beta)[0]
+        predict = rls.predict(x[idx, :])[0]
 
         predicts.append(predict)
 
+        rls.update(x[idx, :], y[idx])
+
         if not recursive:
+            rls.downdate(x[idxRoll, :], y[idxRoll])
             idxRoll += 1
 
+            if idxRoll % idxSplit == 0:
+                rls.fit(x[idxRoll:idx + 1], y[idxRoll:idx + 1])
+
     return np.array(predicts)
 
 
@@ -72,3 +118,82 @@ class HAR_RV(HAR):
             return x
         else:
             return x, y
+
+
+class HAR_RVPanel():
+    """HAR-RV of several tickers estimated at once.
+
+    Takes a panel of daily realized variances, one column per ticker (see panel), and fits the HAR
+    regression of every ticker on the same days with a single batched solve of the normal equations,
+    instead of one OLS per ticker. Regressors of a day are the averages of the last 1, 5 and 22 RVs of
+    the ticker, so a missing RV leaves out of its fit the days whose averages would include it.
+    """
+
+    harLengths = (1, 5, 22)
+
+    def __init__(self, transformRV=np.array):
+        self.transformRV = transformRV
+
+        self.coef_: pd.DataFrame = None
+        self.nobs_: pd.Series = None
+
+    @staticmethod
+    def panel(rvs: dict[str, pd.DataFrame]) -> pd.DataFrame:
+        """Joins the outputs of the RV transformer of several tickers into a panel."""
+        return pd.concat({ticker: rv['RV'] for ticker, rv in rvs.items()}, axis=1).sort_index()
+
+    # (tickers, days, regressors) array of the constant and the HAR averages of the RVs up to every day,
+    # the averages being differences of cumulative sums, NaN where the window has a missing RV
+    def __prepare_inputs__(self, data: pd.DataFrame) -> tuple[np.ndarray, np.ndarray]:
+        rv = self.transformRV(data.to_numpy(dtype=np.float64)).T
+        finite = np.isfinite(rv)
+
+        sums = np.zeros((rv.shape[0], rv.shape[1] + 1))
+        np.cumsum(np.where(finite, rv, 0), axis=1, out=sums[:, 1:])
+        counts = np.zeros(sums.shape, dtype=np.int64)
+        np.cumsum(finite, axis=1, out=counts[:, 1:])
+
+        x = np.full(rv.shape + (1 + len(self.harLengths),), np.nan)
+        x[..., 0] = 1
+
+        for i, harLength in enumerate(self.harLengths, start=1):
+            complete = counts[:, harLength:] - counts[:, :-harLength] == harLength
+            x[:, harLength - 1:, i] = np.where(
+                complete, (sums[:, harLength:] - sums[:, :-harLength]) / harLength, np.nan
+            )
+
+        return x, rv
+
+    def fit(self, data: pd.DataFrame):
+        x, y = self.__prepare_inputs__(data)
+        x, y = x[:, :-1], y[:, 1:]
+
+        mask = np.isfinite(x).all(axis=-1) & np.isfinite(y)
+        x = np.where(mask[..., None], x, 0)
+        y = np.where(mask, y, 0)
+
+        xtx = x.transpose(0, 2, 1) @ x
+        xty = (x.transpose(0, 2, 1) @ y[..., None])[..., 0]
+
+        # tickers with fewer days than regressors are left unfitted
+        nobs = mask.sum(axis=1)
+        fitted = nobs >= x.shape[-1]
+        xtx[~fitted] = np.eye(x.shape[-1])
+
+        coef = np.linalg.solve(xtx, xty[..., None])[..., 0]
+        coef[~fitted] = np.nan
+
+        self.coef_ = pd.DataFrame(
+            coef,
+            index=data.columns,
+            columns=['const'] + [f'rv_{harLength}' for harLength in self.harLengths]
+        )
+        self.nobs_ = pd.Series(nobs, index=data.columns)
+
+        return self
+
+    def predict(self, exog: pd.DataFrame) -> pd.Series:
+        """Forecasts the (transformed) RV of every ticker for the day after the last day of exog."""
+        x, _ = self.__prepare_inputs__(exog[self.coef_.index])
+
+        return pd.Series(np.einsum('tk,tk->t', x[:, -1], self.coef_.to_numpy()), index=self.coef_.index)
@@ -8,6 +8,53 @@ import scipy as sc
 import torch
 
 
+def forward_filter(log_forward: np.ndarray, transmat: np.ndarray, log_emissions: np.ndarray) -> np.ndarray:
+    """Runs the forward recursion of an HMM over a batch of observations.
+
+    Starting from the log forward probabilities log_forward of the last filtered observation, returns
+    the (T, n_states) log forward probabilities after each of the T observations whose emission
+    log-likelihoods are log_emissions. Emissions are exponentiated for all rows at once, shifted by
+    their row maxima, and the recursion runs on probabilities normalized at every step, so each step
+    is a product with transmat; the logs of the shifts and of the normalizing constants are summed
+    back at the end. A step whose probabilities all underflow is computed in log space instead.
+    """
+    log_transmat = None
+
+    log_norm = sc.special.logsumexp(log_forward)
+    alpha = np.exp(log_forward - log_norm)
+
+    emission_max = np.max(log_emissions, axis=1)
+    emissions = np.exp(log_emissions - emission_max.reshape(-1, 1))
+
+    alphas = np.empty(log_emissions.shape)
+    scales = np.empty(log_emissions.shape[0])
+    log_offsets = emission_max.copy()
+
+    for t in range(log_emissions.shape[0]):
+        previous = alpha
+        alpha = (previous @ transmat) * emissions[t]
+        scales[t] = alpha.sum()
+
+        if not scales[t] > 0:
+            with np.errstate(divide='ignore'):
+                if log_transmat is None:
+                    log_transmat = np.log(transmat)
+
+                log_alpha = sc.special.logsumexp(
+                    np.log(previous).reshape(-1, 1) + log_transmat, axis=0
+                ) + log_emissions[t]
+
+            log_offsets[t] = sc.special.logsumexp(log_alpha)
+            alpha = np.exp(log_alpha - log_offsets[t])
+            scales[t] = 1
+
+        alpha /= scales[t]
+        alphas[t] = alpha
+
+    with np.errstate(divide='ignore'):
+        return np.log(alphas) + (log_norm + np.cumsum(np.log(scales) + log_offsets)).reshape(-1, 1)
+
+
 class HMMReturnsMixin:
     def __init__(self):
         self.states_map = None
@@ -137,14 +184,14 @@ class HMMPomegranate(DenseHMM):
 
     def update(self, X: pd.DataFrame):
         X = X.to_numpy()
+        p = torch.stack([d.log_probability(X) for d in self.distributions], dim=1)
 
-        for t in range(X.shape[0]):
-            p = torch.Tensor([d.log_probability(X[t, :].reshape(1, -1)) for d in self.distributions])
-            logp = torch.logsumexp(self.forward_prob, dim=0)
-            self.forward_prob = torch.log(
-                torch.exp(self.forward_prob - logp).reshape(1, -1) @ torch.exp(self.edges)
-            ) + logp + p
-            self.forward_prob = self.forward_prob.reshape(-1)
+        forward = forward_filter(
+            self.forward_prob.double().numpy(),
+            torch.exp(self.edges).double().numpy(),
+            p.double().numpy()
+        )
+        self.forward_prob = torch.as_tensor(forward[-1], dtype=self.forward_prob.dtype)
 
         return self.forward_prob
 
@@ -154,11 +201,13 @@ class HMMLearnGaussian(GaussianHMM, HMMReturnsMixin):
             self,
             n_components=2,
             covariance_type='full',
+            n_tries=10,
             **kwargs
     ):
         super().__init__(n_components=n_components, covariance_type=covariance_type, **kwargs)
 
         self.name = f'HMMLearn(n_components={n_components},covariance_type={covariance_type})'
+        self.n_tries = n_tries
         self.forward_prob = None
         self.posterior_prob = None
 
@@ -168,17 +217,17 @@ class HMMLearnGaussian(GaussianHMM, HMMReturnsMixin):
     def decode(self, X, lengths=None, algorithm=None):
         return super().decode(X, lengths=lengths, algorithm=algorithm)[1]
 
+    # EM is retried up to n_tries times when it fails, the error of the last try is raised
     def fit(self, X: pd.DataFrame, lengths=None):
-        n_tries = 0
-
         X = X.to_numpy()
 
-        while n_tries < 10:
+        for n_try in range(self.n_tries):
             try:
                 super().fit(X, lengths=lengths)
-                n_tries = 10
+                break
             except ValueError:
-                n_tries += 1
+                if n_try == self.n_tries - 1:
+                    raise
 
         self.posterior_prob = self.predict_proba(X, lengths=lengths)[-1, :]
         self.forward_prob = self.posterior_prob + self.score(X, lengths=lengths)
@@ -186,19 +235,17 @@ class HMMLearnGaussian(GaussianHMM, HMMReturnsMixin):
         return self
 
     def update(self, X: pd.DataFrame):
-        X = X.to_numpy()
-        p = self._compute_log_likelihood(X)
-
-        for t in range(X.shape[0]):
-            logp = sc.special.logsumexp(self.forward_prob, axis=0)
+        # the recursion continues from posterior_prob, as fit leaves forward_prob inconsistent with it
+        forward = forward_filter(
+            self.posterior_prob + sc.special.logsumexp(self.forward_prob, axis=0),
+            self.transmat_,
+            self._compute_log_likelihood(X.to_numpy())
+        )
 
-            p_max = np.max(self.posterior_prob)
+        self.forward_prob = forward[-1]
+        self.posterior_prob = self.forward_prob - sc.special.logsumexp(self.forward_prob, axis=0)
 
-            self.forward_prob = np.log(
-                np.exp(self.posterior_prob - p_max).reshape(1, -1) @ self.transmat_
-            ) + logp + p[t, :] + p_max
-            self.forward_prob = self.forward_prob.reshape(-1)
-            self.posterior_prob = self.forward_prob - sc.special.logsumexp(self.forward_prob, axis=0)
+        return forward - sc.special.logsumexp(forward, axis=1).reshape(-1, 1)
 
     def forecast(self, h=1):
         f = np.log(np.exp(self.posterior_prob) @ np.linalg.matrix_power(self.transmat_, h))
@@ -1,5 +1,6 @@
 import numpy as np
 import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
 from datetime import datetime, timezone
 from dataclasses import dataclass
 from typing import Union
@@ -7,6 +8,10 @@ from sklearn.base import BaseEstimator, RegressorMixin, ClassifierMixin
 
 
 class TargetProcessor(BaseEstimator):
+    # ring buffer of update, built from last_data at the first update after fit or predict
+    _buffer: np.ndarray = None
+    _head: int = None
+
     def __init__(
             self,
             target_name: Union[str, list[str]],
@@ -35,12 +40,14 @@ class TargetProcessor(BaseEstimator):
 
         self.last_data = None
 
-    def _transform(self, X):
-        lagged_data = []
+    # names and lags of the columns of the design matrix, in order
+    def _lag_plan(self, columns) -> tuple[list[str], list[int]]:
+        names, lags = [], []
 
         if self.max_lag_columns is None:
-            for column in X.columns:
-                lagged_data.extend([L(X[column], lag=l) for l in range(1, self.max_lag + 1)])
+            for column in columns:
+                names.extend([column] * self.max_lag)
+                lags.extend(range(1, self.max_lag + 1))
         else:
             if self.min_lag_columns is None:
                 self.min_lag_columns = {}
@@ -53,15 +60,25 @@ class TargetProcessor(BaseEstimator):
                 else:
                     min_lag = 1
 
-                lagged_data.extend([L(X[column], lag=l) for l in range(min_lag, max_lag + 1)])
+                names.extend([column] * (max_lag - min_lag + 1))
+                lags.extend(range(min_lag, max_lag + 1))
 
             if self.remainder == 'passthrough':
-                for column in set(X.columns).difference(set(self.max_lag_columns)):
-                    lagged_data.append(L(X[column], lag=0))
+                for column in set(columns).difference(set(self.max_lag_columns)):
+                    names.append(column)
+                    lags.append(0)
 
-        X, y = preprocess_lags(
-            X=lagged_data,
-            y=X[self.target_name]
+        return names, lags
+
+    def _transform(self, X):
+        names, lags = self._lag_plan(X.columns)
+        block_columns = list(dict.fromkeys(names))
+
+        X, y = lag_matrix(
+            X[block_columns].to_numpy(),
+            [block_columns.index(name) for name in names],
+            lags,
+            y=X[self.target_name].to_numpy()
         )
 
         if self.target_transformer is not None:
@@ -69,23 +86,29 @@ class TargetProcessor(BaseEstimator):
 
         return X, y
 
-    def fit(self, X):
+    def fit(self, X, y=None):
         new_X, y = self._transform(X)
         maximum_lag = X.shape[0] - new_X.shape[0]
 
         if maximum_lag > 0:
             self.last_data = X.iloc[-maximum_lag:]
 
+        self._buffer = None
+
         self.estimator.fit(new_X, y)
 
         return self
 
-    def score(self, X):
+    def score(self, X, y=None):
         X, y = self._transform(X)
 
         return self.estimator.score(X, y)
 
     def predict(self, X):
+        if self._buffer is not None:
+            self.last_data = self._buffered_data()
+            self._buffer = None
+
         X = pd.concat([self.last_data, X])
 
         self.last_data = X.iloc[-self.last_data.shape[0]:]
@@ -94,6 +117,44 @@ class TargetProcessor(BaseEstimator):
 
         return self.estimator.predict(X)
 
+    def _init_buffer(self):
+        names, lags = self._lag_plan(self.last_data.columns)
+
+        self._buffer_columns = list(dict.fromkeys(names))
+        self._buffer_column_idx = np.array([self._buffer_columns.index(name) for name in names])
+        self._buffer_lags = np.array(lags)
+
+        size = int(self._buffer_lags.max()) + 1
+        self._buffer = np.zeros((size, len(self._buffer_columns)))
+        self._head = size - 2
+
+        if size > 1:
+            self._buffer[:size - 1] = self.last_data[self._buffer_columns].to_numpy()[-(size - 1):]
+
+    # last_data of the rows passed to update, oldest first, for predict to carry on from them
+    def _buffered_data(self) -> pd.DataFrame:
+        rows = np.roll(self._buffer, -(self._head + 1), axis=0)[1:]
+
+        return pd.DataFrame(rows, columns=self._buffer_columns)
+
+    def update(self, row):
+        """Predicts the target after one new row of inputs, a mapping from column names to values.
+
+        The last max_lag rows of the lagged columns are kept in a ring buffer, so a row costs one feature
+        vector and one call of estimator.predict, without any DataFrame. update and predict can be mixed:
+        predict carries on from the rows passed to update and update from the rows passed to predict.
+        """
+        if self._buffer is None:
+            self._init_buffer()
+
+        size = self._buffer.shape[0]
+        self._head = (self._head + 1) % size
+        self._buffer[self._head] = [row[column] for column in self._buffer_columns]
+
+        x = self._buffer[(self._head - self._buffer_lags) % size, self._buffer_column_idx]
+
+        return self.estimator.predict(x.reshape(1, -1))[0]
+
 
 class TargetProcessorClassifier(TargetProcessor, ClassifierMixin):
     def __init__(self, classes_name: dict = None, **kwargs):
@@ -106,6 +167,9 @@ class TargetProcessorClassifier(TargetProcessor, ClassifierMixin):
 
         return np.array([self.classes_name[pred] for pred in prediction])
 
+    def update(self, row):
+        return self.classes_name[super().update(row)]
+
 
 @dataclass
 class L:
@@ -113,6 +177,23 @@ class L:
     lag: int = 0
 
 
+# design matrix of the block data (rows, columns): column k holds data[:, columns[k]] lagged by lags[k], for
+# the rows that have all their lags. sliding_window_view exposes every row of a series along with its max_lag
+# predecessors without copying, so gathering the requested lags from it is the only copy of the design matrix;
+# series are laid out contiguously, so the design matrix is gathered column by column, in Fortran order
+def lag_matrix(data: np.ndarray, columns: list[int], lags: list[int], y: np.ndarray = None):  # y_t = x_{t - lag}
+    lags = np.asarray(lags)
+    max_lag = int(lags.max())
+
+    windows = sliding_window_view(np.ascontiguousarray(data.T), max_lag + 1, axis=1)
+    X = windows[np.asarray(columns), :, max_lag - lags].T
+
+    if y is None:
+        return X
+    else:
+        return X, np.squeeze(y[max_lag:])
+
+
 def preprocess_lags(X: list[Union[L, pd.Series]], y: pd.DataFrame = None):  # assuming y_t = x_{t - x.lag}
     X = [x if isinstance(x, L) else L(x) for x in X]
 
@@ -121,14 +202,7 @@ def preprocess_lags(X: list[Union[L, pd.Series]], y: pd.DataFrame = None):  # as
         min_date = max(min_date, x.data.index[0])
     min_date = max(min_date, y.index[0])
 
-    for x in X:
-        x.data = x.data[x.data.index >= min_date].to_numpy()
-
-        if x.lag > 0:
-            x.data = x.data[:-x.lag]
+    data = np.column_stack([x.data[x.data.index >= min_date].to_numpy() for x in X])
     y = y[y.index >= min_date].to_numpy()
 
-    max_lag = max([x.lag for x in X])
-    X = np.array([x.data[max_lag - x.lag:] for x in X]).T
-
-    return X, np.squeeze(y[max_lag:, :])
+    return lag_matrix(data, list(range(len(X))), [x.lag for x in X], y=y)
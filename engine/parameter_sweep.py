@@ -0,0 +1,180 @@
+from engine.strategies.strategy import Strategy
+from engine.schemas.mock_client import MockClient
+from engine.trading_interface import TradingInterface
+from engine.start_up import start_up
+from engine.candles.candles_uploader import LocalTSUploader
+from api.broker_list import t_invest
+import pandas as pd
+import os
+import json
+import hashlib
+from time import time
+from copy import deepcopy
+from datetime import timedelta
+from typing import Type
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from sklearn.model_selection import ParameterGrid
+
+
+# columns of the results of a backtest returned by _run_backtest
+result_columns = ['cash', 'profit', 'num_of_trades', 'seconds']
+
+
+# candles of the swept tickers are memory-mapped once per worker process and reused by all its
+# backtests; the mapped pages are shared by all workers through the page cache
+def _init_worker(tickers: list[str]):
+    LocalTSUploader.broker = t_invest
+
+    for ticker in tickers:
+        MockClient.memmap_candles(ticker)
+
+
+def _run_backtest(
+        strategy_constructor: Type[Strategy],
+        strategy_params: dict,
+        mock_client_config: dict,
+        ticker: str,
+        duration: timedelta,
+) -> dict:
+    start = time()
+    strategy = strategy_constructor(**strategy_params)
+
+    client, tickers_collection, client_config, account = start_up(
+        mock_client_config=deepcopy(mock_client_config),
+        tickers_collection=[ticker],
+    )
+
+    cash = TradingInterface(
+        strategies=[strategy],
+        account=account,
+        duration=duration,
+    ).launch(
+        client_constructor=client,
+        client_config=client_config,
+        tickers_collection=tickers_collection
+    )
+
+    return {
+        'cash': cash,
+        'profit': sum(strategy.profits),
+        'num_of_trades': len(strategy.profits),
+        'seconds': round(time() - start, 3),
+    }
+
+
+class ParameterSweep:
+    """Runs a backtest of every combination of strategy and mock client parameters on every ticker.
+
+    Backtests run in a pool of worker processes, one per core by default. Each finished backtest is
+    appended as a row to the csv file at results_path, keyed by a hash of its parameters, so an
+    interrupted sweep is resumed by running it again: combinations already in the file are skipped.
+    The header of the file records the swept parameters, and a sweep over other parameters refuses to
+    append to it.
+    """
+
+    def __init__(
+            self,
+            strategy_constructor: Type[Strategy],
+            strategy_grid: dict[str, list],
+            mock_client_grid: dict[str, list],
+            tickers_collection: list[str],
+            duration: timedelta,
+            results_path: str,
+            n_jobs: int = None,
+    ):
+        self.strategy_constructor = strategy_constructor
+        self.strategy_grid = strategy_grid
+        self.mock_client_grid = mock_client_grid
+        self.tickers_collection = tickers_collection
+        self.duration = duration
+        self.results_path = results_path
+        self.n_jobs = n_jobs if n_jobs is not None else os.cpu_count()
+
+    @staticmethod
+    def run_id(ticker: str, strategy_params: dict, mock_client_config: dict) -> str:
+        params = json.dumps([ticker, strategy_params, mock_client_config], sort_keys=True, default=str)
+
+        return hashlib.sha1(params.encode()).hexdigest()
+
+    def combinations(self) -> list[tuple[str, str, dict, dict]]:
+        return [
+            (self.run_id(ticker, strategy_params, mock_client_config), ticker, strategy_params, mock_client_config)
+            for ticker in self.tickers_collection
+            for strategy_params in ParameterGrid(self.strategy_grid)
+            for mock_client_config in ParameterGrid(self.mock_client_grid)
+        ]
+
+    def columns(self) -> list[str]:
+        return (['run_id', 'ticker']
+                + [f'strategy_{name}' for name in sorted(self.strategy_grid)]
+                + [f'client_{name}' for name in sorted(self.mock_client_grid)]
+                + result_columns)
+
+    def completed_runs(self) -> set[str]:
+        if not os.path.isfile(self.results_path):
+            return set()
+
+        columns = list(pd.read_csv(self.results_path, nrows=0).columns)
+
+        if columns != self.columns():
+            raise ValueError(
+                f'{self.results_path} holds the results of a sweep over other parameters '
+                f'({columns}), pass another results_path.'
+            )
+
+        return set(pd.read_csv(self.results_path, usecols=['run_id'])['run_id'])
+
+    def _write_result(self, row: dict):
+        write_header = not os.path.isfile(self.results_path)
+
+        pd.DataFrame([row], columns=self.columns()).to_csv(
+            self.results_path, mode='a', header=write_header, index=False
+        )
+
+    def run(self) -> pd.DataFrame:
+        completed = self.completed_runs()
+        pending = [combination for combination in self.combinations() if combination[0] not in completed]
+
+        if len(pending) > 0:
+            directory = os.path.dirname(self.results_path)
+
+            if directory != '' and not os.path.isdir(directory):
+                os.makedirs(directory)
+
+            with ProcessPoolExecutor(
+                    max_workers=min(self.n_jobs, len(pending)),
+                    initializer=_init_worker,
+                    initargs=(self.tickers_collection,)
+            ) as executor:
+                futures = {
+                    executor.submit(
+                        _run_backtest,
+                        self.strategy_constructor,
+                        strategy_params,
+                        mock_client_config,
+                        ticker,
+                        self.duration,
+                    ): (run_id, ticker, strategy_params, mock_client_config)
+                    for run_id, ticker, strategy_params, mock_client_config in pending
+                }
+
+                for future in as_completed(futures):
+                    run_id, ticker, strategy_params, mock_client_config = futures[future]
+
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        print(f'[{ticker}] {strategy_params} {mock_client_config} failed: {e!r}')
+                        continue
+
+                    self._write_result(
+                        {'run_id': run_id, 'ticker': ticker}
+                        | {f'strategy_{name}': value for name, value in strategy_params.items()}
+                        | {f'client_{name}': value for name, value in mock_client_config.items()}
+                        | result
+                    )
+
+        if not os.path.isfile(self.results_path):
+            return pd.DataFrame()
+
+        return pd.read_csv(self.results_path)
@@ -6,7 +6,7 @@ from engine.schemas.enums import OrderExecutionReportStatus, OrderDirection, Ord
 from engine.schemas.datatypes import Period, Ticker, Broker
 from engine.schemas.constants import data_path
 from engine.transformers.candles_processing import CandlesRefinerTransformer
-from engine.candles.candles_uploader import LocalTSUploader
+from engine.candles.candles_uploader import LocalTSUploader, ColumnarTSUploader
 from dataclasses import dataclass
 from datetime import datetime, timezone
 import pandas as pd
@@ -94,7 +94,7 @@ class Services(ABC):
         if freq_name in self.local_candles_uploaders.keys():
             candles_uploader = self.local_candles_uploaders[freq_name]
         else:
-            self.local_candles_uploaders[freq_name] = LocalTSUploader(data_path + f'{self.broker}/{ticker.ticker_sign}/{freq_name}.csv')
+            self.local_candles_uploaders[freq_name] = ColumnarTSUploader(data_path + f'{self.broker}/{ticker.ticker_sign}/{freq_name}')
 
         frequency = self.market_data.get_frequency(frequency)
 
@@ -132,6 +132,7 @@ class Services(ABC):
 
         if new_candles.shape[0] != 0:
             candles_uploader.save_new_observations(new_candles)
+            LocalTSUploader.last_candles[ticker] = new_candles
 
             return True
         else:
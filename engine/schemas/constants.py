@@ -2,3 +2,6 @@ import os
 
 data_path = os.getcwd().replace("\\", "/") + '/data/'
 model_path = os.getcwd().replace("\\", "/")  + '/models/'
+log_path = os.getcwd().replace("\\", "/") + '/logs/'
+cache_path = os.getcwd().replace("\\", "/") + '/cache/'
+instrument_path = os.getcwd().replace("\\", "/") + '/instruments/'
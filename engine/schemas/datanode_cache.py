@@ -0,0 +1,140 @@
+import os
+import joblib
+import hashlib
+import pandas as pd
+from datetime import datetime
+
+
+class DataNodeCache:
+    """On-disk cache of the outputs of fitted DataNodes.
+
+    An entry is keyed by the structural hash of the node, which covers the parameters of its transformer
+    and of all the transformers upstream, and by the start of its input data. It holds the output of the
+    node up to an end date along with the fitted transformer, so fitting the same node on the same data
+    again loads it instead of computing it. The entry is reused for another end date only if the
+    transformer fitted on the new range is the same as the cached one: the rows of the parents after the
+    shorter end date are transformed along with lookback rows before it, so windowed transformers see the
+    history they need, and all the rows transformed up to that end date are checked against the entry.
+
+    Entries are evicted least recently used first once the cache exceeds max_bytes. Raw candles are
+    assumed to be appended only: entries are not invalidated when past candles change.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 2 ** 30, lookback: int = 1000):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.lookback = lookback
+
+        if not os.path.isdir(path):
+            os.makedirs(path)
+
+    def key(self, node, start: datetime) -> str:
+        return hashlib.sha1(f'{node.structural_hash()}|{start.isoformat()}'.encode()).hexdigest()
+
+    def get(self, key: str) -> dict:
+        file = self.path + key + '.pkl'
+
+        if not os.path.isfile(file):
+            return None
+
+        # the modification time orders the entries for eviction
+        os.utime(file)
+
+        return joblib.load(file)
+
+    def put(self, key: str, end_date: datetime, data: pd.DataFrame, transformer, fit_hash: str):
+        tmp_file = self.path + key + f'.{os.getpid()}.tmp'
+
+        joblib.dump(
+            {'end_date': end_date, 'data': data, 'transformer': transformer, 'fit_hash': fit_hash},
+            tmp_file
+        )
+        os.replace(tmp_file, self.path + key + '.pkl')
+
+        self.evict()
+
+    def evict(self):
+        entries = []
+
+        for file in os.listdir(self.path):
+            if file.endswith('.pkl'):
+                stat = os.stat(self.path + file)
+                entries.append((stat.st_mtime_ns, stat.st_size, file))
+
+        size = sum(entry_size for _, entry_size, _ in entries)
+
+        for _, entry_size, file in sorted(entries):
+            if size <= self.max_bytes:
+                break
+
+            os.remove(self.path + file)
+            size -= entry_size
+
+    # fits the transformer of node on the first nonempty data of its parents, as transform_parents does, and
+    # returns the hash of the fitted transformer
+    @staticmethod
+    def _fit(node, parents_data: list[pd.DataFrame]) -> str:
+        node.fitted = False
+
+        for parent_data in parents_data:
+            if len(parent_data) > 0:
+                node.transformer.fit(parent_data)
+                node.fitted = True
+
+                break
+
+        return joblib.hash(node.transformer)
+
+    # output of node with the rows of entry up to boundary, or None if the transformed rows do not match them
+    def _transform_tail(self, node, entry: dict, parents_data: list[pd.DataFrame], boundary: datetime):
+        tail = []
+
+        for parent_data in parents_data:
+            start = max(parent_data.index.searchsorted(boundary, side='right') - self.lookback, 0)
+            tail.append(parent_data.iloc[start:])
+
+        transformed = node.transform_parents(tail)
+
+        cached = entry['data'][entry['data'].index <= boundary]
+        overlap = transformed[transformed.index <= boundary]
+
+        # every row of the window up to boundary has to come out as it is in the entry
+        if len(overlap) == 0 or not overlap.index.isin(cached.index).all() \
+                or not overlap.equals(cached.loc[overlap.index]):
+            return None
+
+        return pd.concat([cached, transformed[transformed.index > boundary]])
+
+    def fit_transform(self, node, parents_data: list[pd.DataFrame], start: datetime, end_date: datetime):
+        """Returns the output of node on parents_data, from the cache when possible, and caches it.
+
+        A transformer whose fit depends on the end date, like StandardScaler, does not hash the same once
+        fitted on another range, so its entries are only reused for their own end date. An entry is never
+        replaced by a shorter one.
+        """
+        key = self.key(node, start)
+        entry = self.get(key)
+
+        if entry is not None and entry['end_date'] == end_date:
+            node.transformer = entry['transformer']
+            node.fitted = True
+
+            return entry['data']
+
+        fit_hash = self._fit(node, parents_data)
+        data = None
+
+        if entry is not None and entry.get('fit_hash') == fit_hash:
+            data = self._transform_tail(node, entry, parents_data, min(entry['end_date'], end_date))
+
+            # the transformer is fitted again, as transforming the tail left its state at the end of it
+            if data is None:
+                self._fit(node, parents_data)
+
+        if data is None:
+            data = node.transform_parents(parents_data)
+
+        if entry is None or entry['end_date'] < end_date:
+            self.put(key, end_date, data, node.transformer, fit_hash)
+
+        return data
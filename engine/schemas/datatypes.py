@@ -2,7 +2,12 @@ from abc import ABC, abstractmethod
 from datetime import datetime, timedelta, timezone, date
 from dataclasses import dataclass
 from engine.schemas.enums import InstrumentType, SessionPeriod
+from engine.schemas.constants import data_path
 from decimal import Decimal
+from bisect import bisect_right
+import numpy as np
+import hashlib
+import os
 
 
 @dataclass
@@ -29,6 +34,12 @@ class Period(ABC):
     def update_market_schedule_info(self):
         pass
 
+    # moves time_period to the next minute at which any of types_instruments is traded
+    # if all of them are closed at time_period, raises StopIteration if there is no such minute
+    @abstractmethod
+    def skip_closed_periods(self, types_instruments):
+        pass
+
     def next_period(self, update_with_cur_time: bool):
         if not update_with_cur_time:
             self.time_period += self.time_frequency
@@ -70,17 +81,28 @@ class ExchangeDateTimeInfo:
     time_info: dict[InstrumentType, dict[date, any]]
 
     def __post_init__(self):
+        self._date_keys: dict[InstrumentType, list[date]] = {}
+        self._fetched_info: dict[tuple[InstrumentType, date], any] = {}
+
         for type_instrument in self.time_info.keys():
             self.time_info[type_instrument] |= {date.max: []}
+            self._date_keys[type_instrument] = sorted(self.time_info[type_instrument].keys())
 
     # fetch info at date_key which is greater than a date_query argument
     # implying that the date_key is an effective starting date of new information of the next date_key
     def fetch_info(self, type_instrument: InstrumentType, date_query: date):
-        for date_key_l, date_key_r in zip(list(self.time_info[type_instrument].keys())[:-1],
-                                          list(self.time_info[type_instrument].keys())[1:]):
-            if date_key_l <= date_query < date_key_r:
-                if self.time_info[type_instrument][date_key_l] is not None:
-                    return self.time_info[type_instrument][date_key_l]
+        key = (type_instrument, date_query)
+
+        if key not in self._fetched_info:
+            date_keys = self._date_keys[type_instrument]
+            idx = bisect_right(date_keys, date_query) - 1
+
+            if 0 <= idx < len(date_keys) - 1:
+                self._fetched_info[key] = self.time_info[type_instrument][date_keys[idx]]
+            else:
+                self._fetched_info[key] = None
+
+        return self._fetched_info[key]
 
     # provide a list of tuples (date_interval of type [l, r), info_data)
     def fetch_items(self, type_instrument: InstrumentType) -> list[tuple]:
@@ -122,3 +144,179 @@ class ExchangeIntervalTree(ExchangeDateTimeInfo):
 
             if start_date <= date_query < end_date:
                 return key, interval_info
+
+
+# ----------------- precomputed calendar of trading minutes
+
+@dataclass
+class ExchangeCalendar:
+    """
+    Calendar of trading minutes of an instrument type.
+
+    Sorted array of open trading minutes (counted since the epoch, UTC) with session labels
+    (values of SessionPeriod) and auction labels (NO_AUCTION, OPENING or CLOSING). A minute is open
+    if it is within working hours and not on a break, on a working day which is not a holiday.
+    Open minutes outside every session are labelled SessionPeriod.CLOSED.
+    """
+    minutes: np.ndarray
+    sessions: np.ndarray
+    auctions: np.ndarray
+
+    NO_AUCTION = 0
+    OPENING = 1
+    CLOSING = 2
+
+    # part of the key of calendars cached on disk, to be raised whenever build changes its output
+    version = 2
+
+    @staticmethod
+    def to_minute(date_query: datetime) -> int:
+        return int(date_query.timestamp()) // 60
+
+    @staticmethod
+    def to_minutes(dates) -> np.ndarray:
+        return np.asarray(dates, dtype='datetime64[m]').astype(np.int64)
+
+    @staticmethod
+    def from_minute(minute: int) -> datetime:
+        return datetime.fromtimestamp(int(minute) * 60, tz=timezone.utc)
+
+    @classmethod
+    def build(cls, broker: Broker, type_instrument: InstrumentType, end_date: date) -> 'ExchangeCalendar':
+        holidays, working_weekends = set(broker.holidays), set(broker.working_weekends)
+        minutes, sessions, auctions = [], [], []
+
+        day = broker.start_date
+        while day <= end_date:
+            day_schedule = broker.working_hours.fetch_info(type_instrument, day)
+
+            if ((day.weekday() >= 5 and day not in working_weekends) or day in holidays
+                    or not isinstance(day_schedule, dict) or day_schedule['duration'] <= timedelta(0)):
+                day += timedelta(days=1)
+                continue
+
+            day_open = cls.to_minute(datetime.combine(day, day_schedule['start'], tzinfo=timezone.utc))
+            day_minutes = day_open + np.arange(day_schedule['duration'] // timedelta(minutes=1))
+            open_minute = np.ones(day_minutes.shape, dtype=bool)
+
+            for break_interval in broker.break_in_working_hours.fetch_info(type_instrument, day) or []:
+                break_start = cls.to_minute(datetime.combine(day, break_interval['start'], tzinfo=timezone.utc))
+                break_end = break_start + break_interval['duration'] // timedelta(minutes=1)
+
+                open_minute &= (day_minutes < break_start) | (day_minutes >= break_end)
+
+            day_sessions = np.full(day_minutes.shape, SessionPeriod.CLOSED.value, dtype=np.int8)
+            day_auctions = np.full(day_minutes.shape, cls.NO_AUCTION, dtype=np.int8)
+            day_session_info = broker.session_type.fetch_info(type_instrument, day)
+
+            # the first session containing a minute wins as in ExchangeIntervalTree.items_of_relevant_interval
+            for session, session_info in (day_session_info.items() if isinstance(day_session_info, dict) else []):
+                session_start = cls.to_minute(datetime.combine(day, session_info['start'], tzinfo=timezone.utc))
+                session_end = session_start + session_info['duration'] // timedelta(minutes=1)
+
+                in_session = ((day_sessions == SessionPeriod.CLOSED.value)
+                              & (session_start <= day_minutes) & (day_minutes < session_end))
+                day_sessions[in_session] = session.value
+
+                if session_info['opening']:
+                    day_auctions[in_session & (day_minutes == session_start)] = cls.OPENING
+                # the session ends at session_end, so its closing auction is its last minute
+                if session_info['closing']:
+                    day_auctions[in_session & (day_minutes == session_end - 1)] = cls.CLOSING
+
+            minutes.append(day_minutes[open_minute])
+            sessions.append(day_sessions[open_minute])
+            auctions.append(day_auctions[open_minute])
+
+            day += timedelta(days=1)
+
+        if len(minutes) == 0:
+            return cls(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int8), np.empty(0, dtype=np.int8))
+
+        return cls(np.concatenate(minutes).astype(np.int64), np.concatenate(sessions), np.concatenate(auctions))
+
+    def locate(self, date_query: datetime) -> int:
+        """Returns the position of the minute of date_query in the calendar, or -1 if the minute is closed."""
+        minute = self.to_minute(date_query)
+        idx = np.searchsorted(self.minutes, minute)
+
+        if idx < len(self.minutes) and self.minutes[idx] == minute:
+            return int(idx)
+        else:
+            return -1
+
+    def is_open(self, date_query: datetime) -> bool:
+        return self.locate(date_query) >= 0
+
+    def are_open(self, minutes: np.ndarray) -> np.ndarray:
+        idx = np.minimum(np.searchsorted(self.minutes, minutes), max(len(self.minutes) - 1, 0))
+
+        return (len(self.minutes) > 0) & (self.minutes[idx] == minutes)
+
+    def session(self, date_query: datetime) -> tuple[SessionPeriod, int]:
+        """Returns the session and the auction label of the minute of date_query."""
+        idx = self.locate(date_query)
+
+        if idx < 0:
+            return SessionPeriod.CLOSED, self.NO_AUCTION
+        else:
+            return SessionPeriod(int(self.sessions[idx])), int(self.auctions[idx])
+
+    def next_open(self, date_query: datetime) -> datetime:
+        """Returns the first open minute at or after date_query, or None if the calendar ends before."""
+        idx = np.searchsorted(self.minutes, self.to_minute(date_query))
+
+        if idx < len(self.minutes):
+            return self.from_minute(self.minutes[idx])
+        else:
+            return None
+
+
+_exchange_calendars: dict[tuple[str, InstrumentType], ExchangeCalendar] = {}
+
+
+def get_exchange_calendar(broker: Broker, type_instrument: InstrumentType) -> ExchangeCalendar:
+    """
+    Returns the calendar of trading minutes of a broker and an instrument type.
+
+    Calendars are built once per process and cached on disk at data/<broker>/calendar_<type>.npz.
+    The cache is rebuilt whenever the schedule of the broker changes.
+    """
+    key = (broker.broker_name, type_instrument)
+
+    if key in _exchange_calendars:
+        return _exchange_calendars[key]
+
+    end_date = date(year=datetime.now(tz=timezone.utc).year + 1, month=12, day=31)
+    schedule_hash = hashlib.sha256(repr((
+        broker.working_hours, broker.break_in_working_hours, broker.session_type,
+        broker.holidays, broker.working_weekends, broker.start_date, end_date, ExchangeCalendar.version
+    )).encode()).hexdigest()
+
+    path = data_path + f'{broker.broker_name}/calendar_{type_instrument.name}.npz'
+
+    calendar = None
+    if os.path.isfile(path):
+        with np.load(path) as cached:
+            if str(cached['schedule_hash']) == schedule_hash:
+                calendar = ExchangeCalendar(cached['minutes'], cached['sessions'], cached['auctions'])
+
+    if calendar is None:
+        calendar = ExchangeCalendar.build(broker, type_instrument, end_date)
+
+        if not os.path.isdir(data_path + broker.broker_name):
+            os.makedirs(data_path + broker.broker_name)
+
+        # written aside and moved over the cache, so processes building calendars in parallel
+        # never read a partly written file
+        tmp_path = path + f'.{os.getpid()}.tmp'
+
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, minutes=calendar.minutes, sessions=calendar.sessions,
+                     auctions=calendar.auctions, schedule_hash=schedule_hash)
+
+        os.replace(tmp_path, path)
+
+    _exchange_calendars[key] = calendar
+
+    return calendar
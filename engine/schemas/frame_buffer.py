@@ -0,0 +1,125 @@
+import numpy as np
+import pandas as pd
+
+
+class FrameBuffer:
+    """Append-optimized storage of the rows of a DataFrame.
+
+    Rows are kept in preallocated arrays, one 2D array per dtype like the blocks of a DataFrame, whose
+    capacity doubles when they are full, so appending costs amortized time proportional to the rows
+    appended, however many rows are stored. The DataFrame of the stored rows is only built when frame
+    is called, viewing the arrays when all columns share a dtype, and is reused until the next append.
+    With retention, only the last retention rows are kept: full arrays are compacted instead of grown,
+    so memory stays bounded by about twice the retention window.
+    """
+
+    def __init__(self, data: pd.DataFrame, retention: int = None, capacity: int = 1024):
+        self.retention = retention
+        self.columns = data.columns
+        self.dtypes = data.dtypes
+        self.index_name = data.index.name
+        self.tz = getattr(data.index, 'tz', None)
+
+        if self.retention is not None:
+            data = data.iloc[-self.retention:] if self.retention > 0 else data.iloc[:0]
+
+        capacity = max(capacity, 2 * data.shape[0])
+
+        self._index = np.empty(capacity, dtype=self._index_values(data.index).dtype)
+
+        # columns of pandas extension dtypes are stored as numpy arrays and cast back by frame
+        storage_dtypes = [data[column].to_numpy().dtype for column in self.columns]
+        self._blocks: list[tuple[list[int], np.ndarray]] = []
+
+        for dtype in dict.fromkeys(storage_dtypes):
+            positions = [i for i, storage_dtype in enumerate(storage_dtypes) if storage_dtype == dtype]
+            self._blocks.append((positions, np.empty((capacity, len(positions)), dtype=dtype)))
+
+        self._start = 0
+        self._stop = 0
+        self._frame: pd.DataFrame = None
+
+        self.append(data)
+
+    def __len__(self):
+        return self._stop - self._start
+
+    def _index_values(self, index: pd.Index) -> np.ndarray:
+        if self.tz is not None:
+            index = index.tz_convert(None)
+
+        return index.to_numpy()
+
+    def _moved(self, array: np.ndarray, capacity: int) -> np.ndarray:
+        new_array = np.empty((capacity,) + array.shape[1:], dtype=array.dtype)
+        new_array[:len(self)] = array[self._start:self._stop]
+
+        return new_array
+
+    # makes room for n more rows, by compacting the kept rows to the front of new arrays, which are grown
+    # if the rows would fill more than half of them; frames already built keep viewing the old arrays
+    def _reserve(self, n: int):
+        capacity = len(self._index)
+
+        if self._stop + n <= capacity:
+            return
+
+        if len(self) + n > capacity // 2:
+            capacity = max(2 * capacity, 2 * (len(self) + n))
+
+        self._index = self._moved(self._index, capacity)
+        self._blocks = [(positions, self._moved(array, capacity)) for positions, array in self._blocks]
+
+        self._start, self._stop = 0, self._stop - self._start
+
+    def append(self, data: pd.DataFrame):
+        n = data.shape[0]
+
+        if n == 0:
+            return
+
+        if self.retention is not None and n > self.retention:
+            data = data.iloc[n - self.retention:]
+            n = self.retention
+
+        if self.retention is not None:
+            self._start = max(self._start, self._stop + n - self.retention)
+
+        self._reserve(n)
+
+        self._index[self._stop:self._stop + n] = self._index_values(data.index)
+
+        if len(self._blocks) == 1:
+            self._blocks[0][1][self._stop:self._stop + n] = data.to_numpy()
+        else:
+            for positions, array in self._blocks:
+                array[self._stop:self._stop + n] = data.iloc[:, positions].to_numpy()
+
+        self._stop += n
+        self._frame = None
+
+    def frame(self) -> pd.DataFrame:
+        if self._frame is None:
+            index = pd.Index(self._index[self._start:self._stop], name=self.index_name)
+
+            if self.tz is not None:
+                index = index.tz_localize('UTC').tz_convert(self.tz)
+
+            frames = [
+                pd.DataFrame(array[self._start:self._stop], index=index, columns=self.columns[positions], copy=False)
+                for positions, array in self._blocks
+            ]
+
+            if len(frames) == 1:
+                self._frame = frames[0]
+            else:
+                self._frame = pd.concat(frames, axis=1)[self.columns]
+
+            extension_dtypes = {
+                column: dtype for column, dtype in self.dtypes.items() if not isinstance(dtype, np.dtype)
+            }
+
+            if len(extension_dtypes) > 0:
+                self._frame = self._frame.astype(extension_dtypes)
+
+        return self._frame
@@ -9,15 +9,19 @@ from api.tinvest.utils import to_quotation
 import api.tinvest.tclient as t_api
 from api.broker_list import t_invest
 from engine.schemas.client import Client
+import engine.schemas.client as local_api
 from engine.schemas.datatypes import Ticker, Period
 from engine.schemas.pipeline import Pipeline
 from engine.schemas.enums import OrderDirection, OrderExecutionReportStatus, SessionPeriod, OrderType
-from engine.candles.candles_uploader import LocalTSUploader
+from engine.candles.candles_uploader import LocalTSUploader, PartitionedCandlesStore
 import pandas as pd
+import numpy as np
 from decimal import Decimal
 from dataclasses import dataclass
 from typing import Optional
 from datetime import datetime, timedelta
+from bisect import bisect_left, bisect_right, insort
+from math import inf
 
 from abc import ABC, abstractmethod
 
@@ -34,7 +38,10 @@ class MockClient(Client, ABC):
             buy_price_end_period: str = 'low',
             sell_price_end_period: str = 'high',
             lag_in_cached_candles: int = 1,
-            cash: float = 100000
+            cash: float = 100000,
+            skip_closed_periods: bool = False,
+            end_period: datetime = None,
+            history: timedelta = None,
     ):
         super().__init__()
 
@@ -44,24 +51,34 @@ class MockClient(Client, ABC):
         self.buy_price_end_period = buy_price_end_period
         self.sell_price_end_period = sell_price_end_period
         self.lag_in_cached_candles = lag_in_cached_candles
+        self.skip_closed_periods = skip_closed_periods
 
-        self.period: Period = Period(time_period=period)
+        self.period: Period = self.new_period(period)
         self.period_duration = 0
         self.services: MockClientServices = None
         self._cash = cash
 
         self.uid_to_tickers = {ticker.uid: ticker for ticker in tickers}
+        self.types_instruments = list(set([ticker.type_instrument for ticker in tickers]))
 
+        # candles are memory-mapped, so slices below are views shared with other backtest processes
         self.candle_data: dict = {
-            ticker:
-                LocalTSUploader.download_ts(ticker=ticker) for ticker in tickers
+            ticker: self.load_candles(
+                ticker,
+                start=None if history is None else period - history,
+                end=end_period
+            )
+            for ticker in tickers
+        }
+        # one contiguous float64 array per price field, the current candle of a ticker is at last_candles_idx
+        self.candle_prices: dict[Ticker, dict[str, np.ndarray]] = {
+            ticker: {field: candles_df[field].to_numpy(dtype=np.float64) for field in ('open', 'high', 'low', 'close')}
+            for ticker, candles_df in self.candle_data.items()
         }
-        self.current_candles = {ticker: {} for ticker in self.candle_data.keys()}
         self.last_candles_idx = {ticker: 0 for ticker in self.candle_data.keys()}
 
         for ticker, candles_df in self.candle_data.items():
             self.last_candles_idx[ticker] = (candles_df.index <= self.period.time_period).argmin() - 1
-            self.current_candles[ticker] = candles_df.iloc[self.last_candles_idx[ticker]].to_dict()
 
         for ticker in self.candle_data.keys():
             LocalTSUploader.candles_in_memory[ticker] = \
@@ -73,6 +90,17 @@ class MockClient(Client, ABC):
             LocalTSUploader.candles_start_dates[ticker] = \
                 self.period.time_period + timedelta(minutes=1)
 
+    # candles are mapped once per process and reused by every mock client created in it
+    @classmethod
+    def memmap_candles(cls, ticker_sign: str) -> pd.DataFrame:
+        return PartitionedCandlesStore(LocalTSUploader.broker).memmap_columnar(ticker_sign)
+
+    # candles of [start, end] of the ticker, only the months overlapping the range are mapped
+    # if the ticker is in the partitioned store, otherwise its whole history is
+    @classmethod
+    def load_candles(cls, ticker: Ticker, start: datetime = None, end: datetime = None) -> pd.DataFrame:
+        return PartitionedCandlesStore(LocalTSUploader.broker).read_candles(ticker, start, end)
+
     def __enter__(self):
         self.services = MockClientServices(self)
         return self
@@ -80,64 +108,63 @@ class MockClient(Client, ABC):
     def __exit__(self, exc_type, exc_val, exc_tb):
         return False
 
+    def current_price(self, ticker: Ticker, price_type: str) -> float:
+        idx = self.last_candles_idx[ticker]
+
+        if price_type == 'mid':
+            return (float(self.candle_prices[ticker]['low'][idx]) + float(self.candle_prices[ticker]['high'][idx])) / 2
+        else:
+            return float(self.candle_prices[ticker][price_type][idx])
+
+    # prices at which limit buy, limit sell and market orders are filled by the current candle
+    def _fill_prices(self, ticker: Ticker) -> tuple[Decimal, Decimal, Decimal]:
+        mid = (round(Decimal(self.current_price(ticker, 'high')), 9)
+               + round(Decimal(self.current_price(ticker, 'low')), 9)) / 2
+
+        return tuple(
+            mid if price_type == 'mid' else round(Decimal(self.current_price(ticker, price_type)), 9)
+            for price_type in (self.buy_price_end_period, self.sell_price_end_period, self.market_order_price)
+        )
+
     def next_period(self):
-        for order in self.services.orders.order_history:
-            ticker = self.uid_to_tickers[order.instrument_id]
+        fills = []
 
-            if (self.period.instrument_session[ticker.type_instrument]
-                    == SessionPeriod.CLOSED):
+        for instrument_id, open_orders in self.services.orders.open_orders.items():
+            ticker = self.uid_to_tickers[instrument_id]
+
+            if (not open_orders
+                    or self.period.instrument_session[ticker.type_instrument] == SessionPeriod.CLOSED):
                 continue
 
-            if order.status == OrderExecutionReportStatus.EXECUTION_REPORT_STATUS_NEW:
-                p = round(order.price, 9)
-                mid = (round(Decimal(self.current_candles[ticker]['high']), 9)
-                       + round(Decimal(self.current_candles[ticker]['low']), 9) ) / 2
-
-                if self.buy_price_end_period == 'mid':
-                    p_buy = mid
-                else:
-                    p_buy = round(Decimal(self.current_candles[ticker][self.buy_price_end_period]), 9)
-
-                if self.sell_price_end_period == 'mid':
-                    p_sell = mid
-                else:
-                    p_sell = round(Decimal(self.current_candles[ticker][self.sell_price_end_period]), 9)
-
-                if self.market_order_price == 'mid':
-                    p_market = mid
-                else:
-                    p_market = round(Decimal(self.current_candles[ticker][self.market_order_price]), 9)
-
-                if order.order_type == OrderType.ORDER_TYPE_LIMIT:
-                    if ((order.direction == OrderDirection.ORDER_DIRECTION_BUY and p >= p_buy)
-                            or (order.direction == OrderDirection.ORDER_DIRECTION_SELL and p <= p_sell)):
-                        order.status = OrderExecutionReportStatus.EXECUTION_REPORT_STATUS_FILL
-                        order.executed_order_price = p
-                        order.lots_executed = order.quantity
-                        order.executed_commission = Decimal(0)
-                        order.total_order_amount = order.quantity * p * ticker.lot
-
-                        self._cash += float(order.quantity * p * ticker.lot
-                                            * (-1 if order.direction == OrderDirection.ORDER_DIRECTION_BUY else 1))
-                elif order.order_type == OrderType.ORDER_TYPE_MARKET:
-                    order.status = OrderExecutionReportStatus.EXECUTION_REPORT_STATUS_FILL
-                    order.executed_order_price = p_market
-                    order.lots_executed = order.quantity
-                    order.executed_commission = Decimal(0)
-                    order.total_order_amount = order.quantity * p_market * ticker.lot
-
-                    self._cash += float(order.quantity * p_market * ticker.lot
-                                        * (-1 if order.direction == OrderDirection.ORDER_DIRECTION_BUY else 1))
+            fills += open_orders.pop_fillable(*self._fill_prices(ticker))
 
-        for ticker, candles_df in self.candle_data.items():
+        # fills are applied in posting order, so cash is accumulated exactly as before
+        for order_id, p in sorted(fills):
+            order = self.services.orders.order_history[order_id]
+            ticker = self.uid_to_tickers[order.instrument_id]
+
+            order.status = OrderExecutionReportStatus.EXECUTION_REPORT_STATUS_FILL
+            order.executed_order_price = p
+            order.lots_executed = order.quantity
+            order.executed_commission = Decimal(0)
+            order.total_order_amount = order.quantity * p * ticker.lot
+
+            self._cash += float(order.quantity * p * ticker.lot
+                                * (-1 if order.direction == OrderDirection.ORDER_DIRECTION_BUY else 1))
+
+        for ticker in self.candle_data.keys():
             if self.period.instrument_session[ticker.type_instrument] == SessionPeriod.CLOSED:
                 continue
 
             self.last_candles_idx[ticker] += 1
-            self.current_candles[ticker] = candles_df.iloc[self.last_candles_idx[ticker]].to_dict()
 
         self.period.next_period(update_with_cur_time=False)
 
+        # nothing changes for strategies while every traded instrument is closed,
+        # so the clock jumps straight to the next open minute
+        if self.skip_closed_periods:
+            self.period.skip_closed_periods(self.types_instruments)
+
     def get_account(self, account_type):
         return MockUsers(self.services).account
 
@@ -150,6 +177,12 @@ class MockClient(Client, ABC):
         pass
 
 
+    # period of the broker of the client, Period itself is abstract
+    @staticmethod
+    @abstractmethod
+    def new_period(time_period: datetime) -> Period:
+        pass
+
     @staticmethod
     @abstractmethod
     def price_correction(price, ticker) -> Decimal:
@@ -162,7 +195,7 @@ class MockClient(Client, ABC):
 
 
 class MockClientServices(local_api.Services):
-    def __init__(self, client: TMockClient):
+    def __init__(self, client: MockClient):
         self.client = client
         self.orders: MockOrders = MockOrders(self)
         self.market_data: MockMarketData = MockMarketData(self)
@@ -185,7 +218,7 @@ class MockClientServices(local_api.Services):
 
         self.last_cached_candles_idx[ticker] = self.client.last_candles_idx[ticker]
 
-        LocalTSUploader.save_new_observations(new_candles, ticker)
+        LocalTSUploader.last_candles[ticker] = new_candles
 
         return len(new_candles) > 0
 
@@ -218,28 +251,96 @@ class MockOrder:
     total_order_amount: Decimal
 
 
+class MockOpenOrders:
+    """Live orders of one instrument.
+
+    Limit buys are kept sorted by descending price and limit sells by ascending price, so
+    the orders crossed by a candle form a prefix of each list and are found by bisection
+    instead of scanning the whole order history. Market orders are filled by the next candle.
+    """
+
+    def __init__(self):
+        self.limit_buys: list[tuple[Decimal, int]] = []
+        self.limit_sells: list[tuple[Decimal, int]] = []
+        self.market: list[int] = []
+
+    def __bool__(self):
+        return bool(self.limit_buys or self.limit_sells or self.market)
+
+    @staticmethod
+    def _key(order: MockOrder) -> tuple[Decimal, int]:
+        p = round(order.price, 9)
+
+        return -p if order.direction == OrderDirection.ORDER_DIRECTION_BUY else p, int(order.order_id)
+
+    def _book(self, order: MockOrder) -> Optional[list]:
+        if order.order_type == OrderType.ORDER_TYPE_MARKET:
+            return self.market
+        elif order.order_type == OrderType.ORDER_TYPE_LIMIT:
+            return self.limit_buys if order.direction == OrderDirection.ORDER_DIRECTION_BUY else self.limit_sells
+
+        return None
+
+    def add(self, order: MockOrder):
+        book = self._book(order)
+
+        if book is self.market:
+            book.append(int(order.order_id))
+        elif book is not None:
+            insort(book, self._key(order))
+
+    def remove(self, order: MockOrder):
+        book = self._book(order)
+
+        if book is self.market:
+            book.remove(int(order.order_id))
+        elif book is not None:
+            key = self._key(order)
+            idx = bisect_left(book, key)
+
+            if idx < len(book) and book[idx] == key:
+                del book[idx]
+
+    # pops the orders filled by the given prices, returns pairs (order id, execution price)
+    def pop_fillable(self, p_buy: Decimal, p_sell: Decimal, p_market: Decimal) -> list[tuple[int, Decimal]]:
+        n_buys = bisect_right(self.limit_buys, (-p_buy, inf))
+        n_sells = bisect_right(self.limit_sells, (p_sell, inf))
+
+        fills = ([(order_id, -p) for p, order_id in self.limit_buys[:n_buys]]
+                 + [(order_id, p) for p, order_id in self.limit_sells[:n_sells]]
+                 + [(order_id, p_market) for order_id in self.market])
+
+        del self.limit_buys[:n_buys]
+        del self.limit_sells[:n_sells]
+        self.market.clear()
+
+        return fills
+
+
 class MockOrders(MockService, local_api.OrdersService):
     order_history: list[MockOrder]
 
     def __init__(self, client):
         super().__init__(client)
         self.order_history = []
+        self.open_orders: dict[str, MockOpenOrders] = {}
         self.id = 0
 
     def post_order(self, *args, quantity: int = 0, price: Decimal = None,
                    direction: OrderDirection = OrderDirection.ORDER_DIRECTION_UNSPECIFIED,
                    account_id: str = "", order_type: OrderType = OrderType.ORDER_TYPE_UNSPECIFIED,
                    order_id: str = "", instrument_id: str = "") -> local_api.PostOrderResponse:
-        self.order_history.append(
-            MockOrder(order_id=str(self.id),
-                      instrument_id=instrument_id,
-                      price=price, quantity=quantity,
-                      direction=direction,
-                      order_type=order_type,
-                      status=OrderExecutionReportStatus.EXECUTION_REPORT_STATUS_NEW,
-                      executed_order_price=None, lots_executed=None,
-                      executed_commission=None, total_order_amount=None)
-        )
+        order = MockOrder(order_id=str(self.id),
+                          instrument_id=instrument_id,
+                          price=price, quantity=quantity,
+                          direction=direction,
+                          order_type=order_type,
+                          status=OrderExecutionReportStatus.EXECUTION_REPORT_STATUS_NEW,
+                          executed_order_price=None, lots_executed=None,
+                          executed_commission=None, total_order_amount=None)
+
+        self.order_history.append(order)
+        self.open_orders.setdefault(instrument_id, MockOpenOrders()).add(order)
 
         self.id += 1
 
@@ -258,8 +359,13 @@ class MockOrders(MockService, local_api.OrdersService):
     ) -> local_api.CancelOrderResponse:
         order_id = int(order_id)
 
-        if self.order_history[order_id].status != OrderExecutionReportStatus.EXECUTION_REPORT_STATUS_FILL:
-            self.order_history[order_id].status = OrderExecutionReportStatus.EXECUTION_REPORT_STATUS_CANCELLED
+        order = self.order_history[order_id]
+
+        if order.status == OrderExecutionReportStatus.EXECUTION_REPORT_STATUS_NEW:
+            self.open_orders[order.instrument_id].remove(order)
+
+        if order.status != OrderExecutionReportStatus.EXECUTION_REPORT_STATUS_FILL:
+            order.status = OrderExecutionReportStatus.EXECUTION_REPORT_STATUS_CANCELLED
 
     def get_order_state(
             self, *,
@@ -293,6 +399,9 @@ class MockMarketData(MockService, local_api.MarketDataService):
     def get_candles(self, *args, **kwargs):
         pass
 
+    def get_frequency(self, frequency: int):
+        pass
+
     def get_order_book(
             self, *,
             depth: int = None,
@@ -301,17 +410,8 @@ class MockMarketData(MockService, local_api.MarketDataService):
     ) -> local_api.GetOrderBookResponse:
         ticker = self.client.uid_to_tickers[instrument_id]
 
-        mid = (self.client.current_candles[ticker]['low'] + self.client.current_candles[ticker]['high']) / 2
-
-        if self.client.bid_orderbook_price == 'mid':
-            p_bid = mid
-        else:
-            p_bid = self.client.current_candles[ticker][self.client.bid_orderbook_price]
-
-        if self.client.ask_orderbook_price == 'mid':
-            p_ask = mid
-        else:
-            p_ask = self.client.current_candles[ticker][self.client.ask_orderbook_price]
+        p_bid = self.client.current_price(ticker, self.client.bid_orderbook_price)
+        p_ask = self.client.current_price(ticker, self.client.ask_orderbook_price)
 
         return local_api.GetOrderBookResponse(
             bids=[local_api.Order(price=p_bid,
@@ -0,0 +1,156 @@
+import os
+import json
+import joblib
+from copy import copy, deepcopy
+from sklearn.base import BaseEstimator
+from bisect import bisect_right
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+
+class ModelRegistry:
+    """Index of the models saved in model directories.
+
+    A model directory (e.g. model_path + 'broker/SBER/LogisticReg(return_lag=5)/') holds the snapshots
+    of one model of one ticker, named by their fit dates. Its index.json keeps the fit dates sorted
+    along with their files, so the model active at a date is found by bisection without listing and
+    parsing the directory. Indexes are read once per process and reread when the directory changes.
+
+    Loaded models are kept in a bounded in-process cache: loading the same snapshot again, e.g. for
+    several strategies or tickers, returns a copy of the cached model instead of deserializing the file.
+    Copies are returned because models keep state between predictions, but only that state is copied:
+    parameters and fitted attributes are shared with the cached model.
+    """
+
+    index_file = 'index.json'
+    date_format = '%Y-%m-%d_%H-%M-%S'
+    max_cached_models = 32
+
+    _indexes: dict[str, tuple[int, list[datetime], list[str]]] = {}
+    _models: OrderedDict = OrderedDict()
+    _param_names: dict[type, set[str]] = {}
+
+    @classmethod
+    def fit_date(cls, file: str) -> datetime:
+        return datetime.strptime(file[:file.rfind('.')], cls.date_format).replace(tzinfo=timezone.utc)
+
+    @classmethod
+    def file_name(cls, fit_date: datetime) -> str:
+        return fit_date.strftime(cls.date_format) + '.pkl'
+
+    @classmethod
+    def _write_index(cls, path: str, fit_dates: list[datetime], files: list[str]):
+        ticker_sign, model_name = (path.rstrip('/').split('/') + ['', ''])[-2:]
+
+        tmp_file = path + cls.index_file + f'.{os.getpid()}.tmp'
+
+        with open(tmp_file, 'w') as f:
+            json.dump({
+                'ticker': ticker_sign,
+                'model': model_name,
+                'fit_dates': [fit_date.isoformat() for fit_date in fit_dates],
+                'files': files,
+            }, f)
+
+        os.replace(tmp_file, path + cls.index_file)
+
+    @classmethod
+    def rebuild(cls, path: str):
+        """Indexes the snapshots found in the directory, for directories filled without TSPipeline.save."""
+        entries = sorted(
+            (cls.fit_date(file), file) for file in os.listdir(path)
+            if file.endswith('.pkl')
+        )
+
+        cls._write_index(path, [fit_date for fit_date, _ in entries], [file for _, file in entries])
+        cls._indexes.pop(path, None)
+
+    @classmethod
+    def index(cls, path: str) -> tuple[list[datetime], list[str]]:
+        if not os.path.isfile(path + cls.index_file):
+            cls.rebuild(path)
+
+        modified = os.stat(path).st_mtime_ns
+
+        if path not in cls._indexes or cls._indexes[path][0] != modified:
+            with open(path + cls.index_file, 'r') as f:
+                index = json.load(f)
+
+            cls._indexes[path] = (
+                modified,
+                [datetime.fromisoformat(fit_date) for fit_date in index['fit_dates']],
+                index['files'],
+            )
+
+        return cls._indexes[path][1], cls._indexes[path][2]
+
+    @classmethod
+    def register(cls, path: str, fit_date: datetime):
+        fit_dates, files = (list(entries) for entries in cls.index(path))
+        file = cls.file_name(fit_date)
+
+        if file not in files:
+            idx = bisect_right(fit_dates, fit_date)
+            fit_dates.insert(idx, fit_date)
+            files.insert(idx, file)
+
+        cls._write_index(path, fit_dates, files)
+        cls._indexes.pop(path, None)
+        cls._models.pop(path + file, None)
+
+    @classmethod
+    def lookup(cls, path: str, date: datetime) -> tuple[str, datetime]:
+        """Returns the file of the latest model fitted at or before date and the fit date of the next one."""
+        fit_dates, files = cls.index(path)
+        idx = bisect_right(fit_dates, date) - 1
+
+        if idx < 0:
+            raise FileNotFoundError(f'No model in {path} was fitted before {date}.')
+
+        if idx + 1 < len(fit_dates):
+            next_fit_date = fit_dates[idx + 1]
+        else:
+            next_fit_date = datetime.max.replace(tzinfo=timezone.utc)
+
+        return path + files[idx], next_fit_date
+
+    # copy of an estimator for a new holder: its parameters and fitted attributes (named with a trailing
+    # underscore) are left untouched by predictions and shared, the rest of its state is copied, and the
+    # estimators it holds, e.g. the steps of a pipeline, are copied the same way
+    @classmethod
+    def copy_state(cls, estimator):
+        if not isinstance(estimator, BaseEstimator):
+            return deepcopy(estimator)
+
+        if type(estimator) not in cls._param_names:
+            cls._param_names[type(estimator)] = set(estimator._get_param_names())
+
+        param_names = cls._param_names[type(estimator)]
+        estimator = copy(estimator)
+
+        for name, value in list(vars(estimator).items()):
+            if name == 'steps':
+                estimator.steps = [(step_name, cls.copy_state(step)) for step_name, step in value]
+            elif isinstance(value, BaseEstimator):
+                setattr(estimator, name, cls.copy_state(value))
+            elif name not in param_names and not (name.endswith('_') and not name.startswith('_')):
+                setattr(estimator, name, deepcopy(value))
+
+        return estimator
+
+    @classmethod
+    def load(cls, path: str, date: datetime):
+        file, next_fit_date = cls.lookup(path, date)
+
+        if file in cls._models:
+            cls._models.move_to_end(file)
+        else:
+            cls._models[file] = joblib.load(file)
+
+            if len(cls._models) > cls.max_cached_models:
+                cls._models.popitem(last=False)
+
+        model = cls.copy_state(cls._models[file])
+        model.next_cached_model_date = next_fit_date
+
+        return model
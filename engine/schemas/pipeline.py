@@ -1,12 +1,18 @@
 from engine.schemas.datatypes import Ticker
-from engine.candles.candles_uploader import LocalTSUploader
+from engine.schemas.model_registry import ModelRegistry
+from engine.schemas.datanode_cache import DataNodeCache
+from engine.schemas.frame_buffer import FrameBuffer
+from engine.candles.candles_uploader import LocalTSUploader, PartitionedCandlesStore
 from engine.transformers.candles_processing import RemoveSession
 import pandas as pd
 from datetime import datetime, timezone
 import os
+import json
+import hashlib
 import joblib
 
 from sklearn.pipeline import Pipeline
+from sklearn.base import TransformerMixin, BaseEstimator, clone
 
 
 class TSPipeline(Pipeline):
@@ -18,45 +24,24 @@ class TSPipeline(Pipeline):
             **kwargs
     ):
         if path is not None:
-            pickled_models = []
-
-            for model in os.listdir(path):
-                pickled_models.append(path + model)
-
-            latest_model = None
-
-            for path_to_pickled_file in pickled_models:
-                fit_date = path_to_pickled_file[path_to_pickled_file.rfind('/') + 1:path_to_pickled_file.rfind('.')]
-                fit_date = datetime.strptime(
-                    fit_date,
-                    '%Y-%m-%d_%H-%M-%S',
-                ).replace(tzinfo=timezone.utc)
-
-                if train_split_date >= fit_date:
-                    latest_model = path_to_pickled_file
-                else:
-                    next_cached_model_date = fit_date
-                    break
-            else:
-                next_cached_model_date = datetime.max.replace(tzinfo=timezone.utc)
-
-            pipe = joblib.load(latest_model)
-            pipe.next_cached_model_date = next_cached_model_date
-
-            return pipe
+            return ModelRegistry.load(path, train_split_date)
         else:
             return super().__new__(cls)
 
     def __init__(self,
-                 steps,
+                 steps=None,
                  fit_date: datetime = datetime.now(tz=timezone.utc),
                  path: str = None,
                  **kwargs,
                  ):
-        if path is None:
-            self.fit_date: datetime = fit_date
-            self.next_cached_model_date: datetime = None
-            
+        # a pipeline loaded in __new__ is already initialized
+        if path is not None:
+            return
+
+        self.fit_date: datetime = fit_date
+        self.path = path
+        self.next_cached_model_date: datetime = None
+
         super().__init__(steps, **kwargs)
 
     # def add_nodes(
@@ -164,13 +149,14 @@ class TSPipeline(Pipeline):
         if not os.path.isdir(path):
             os.makedirs(path)
 
-        path += f'{self.fit_date.strftime("%Y-%m-%d_%H-%M-%S.pkl")}'
-
-        joblib.dump(self, path)
+        joblib.dump(self, path + ModelRegistry.file_name(self.fit_date))
+        ModelRegistry.register(path, self.fit_date)
 
+    # swaps the pipeline in place for the latest model saved at path before cur_date,
+    # so every holder of the pipeline starts using the new model
     def reload_model(self, path, cur_date: datetime):
         if cur_date >= self.next_cached_model_date:
-            self.load_model(path)
+            self.__dict__.update(TSPipeline(path=path, train_split_date=cur_date).__dict__)
 
             return True
         else:
@@ -178,12 +164,16 @@ class TSPipeline(Pipeline):
 
 
 class DataNode:
+    # outputs of fitted nodes are cached on disk once a DataNodeCache is set
+    cache: DataNodeCache = None
+
     def __init__(
             self,
             ticker: Ticker,
             transformer=None,
             parents: list['DataNode'] = None,
-            remove_session: list[str] = None
+            remove_session: list[str] = None,
+            retention: int = None,
     ):
         self.ticker = ticker
         self.transformer = transformer
@@ -191,7 +181,9 @@ class DataNode:
         self.end_date = None
         self.children = []
         self.data = None
-        self.new_data = []
+        self.buffer: FrameBuffer = None
+        self.retention = retention
+        self.last_new_data = None
         self.n_of_new_data_processed = 0
         self.data_broker = []
         self.remove_session = remove_session
@@ -200,33 +192,38 @@ class DataNode:
 
         self.fitted = False
 
-    def fit(self, X: pd.DataFrame, fit_date=None, end_date=None):
+        self.update_date = None
+        self.last_update = None
+
+    def fit(self, X: pd.DataFrame = None, fit_date=None, end_date=None):
         if self.end_date is None:
             self.end_date = end_date
 
+        # without candles given, only the months of the range are read if the ticker is in the partitioned
+        # store, otherwise the range is sliced from its whole columnar candles, as mock clients do
+        if X is None and self.data is None:
+            X = PartitionedCandlesStore(LocalTSUploader.broker).read_candles(self.ticker, fit_date, end_date)
+
         if self.parents is not None:
-            data = []
+            parents_data = []
 
             for parent in self.parents:
                 if parent.data is None:
-                    parent_data = parent.fit(X, fit_date=fit_date, end_date=end_date)
+                    parents_data.append(parent.fit(X, fit_date=fit_date, end_date=end_date))
                 else:
-                    parent_data = parent.data
-
-                if len(parent_data) == 0:
-                    data.append(pd.DataFrame())
-                elif (self.data is None) and (not self.fitted):
-                    data.append(self.transformer.fit_transform(parent_data))
-
-                    self.fitted = True
-                elif self.data is None:
-                    data.append(self.transformer.transform(parent.data))
+                    parents_data.append(parent.data)
 
             if self.data is None:
-                self.data = pd.concat(data, axis=1, join='inner')
-
-                if self.prefix is not None:
-                    self.data = self.data.add_prefix(self.prefix)
+                # fitted nodes only transform, the cache is for fitting them on candles
+                if DataNode.cache is None or self.fitted or len(X) == 0:
+                    self.data = self.transform_parents(parents_data)
+                else:
+                    self.data = DataNode.cache.fit_transform(
+                        self,
+                        parents_data,
+                        start=X.index[0] if fit_date is None else fit_date,
+                        end_date=end_date
+                    )
         else:
             if self.data is None:
                 self.data = X
@@ -245,7 +242,32 @@ class DataNode:
 
         return self.data
 
+    # output of the transformer on the data of the parents, fitting it if the node is not fitted yet
+    def transform_parents(self, parents_data: list[pd.DataFrame]) -> pd.DataFrame:
+        data = []
+
+        for parent_data in parents_data:
+            if len(parent_data) == 0:
+                data.append(pd.DataFrame())
+            elif not self.fitted:
+                data.append(self.transformer.fit_transform(parent_data))
+
+                self.fitted = True
+            else:
+                data.append(self.transformer.transform(parent_data))
+
+        data = pd.concat(data, axis=1, join='inner')
+
+        if self.prefix is not None:
+            data = data.add_prefix(self.prefix)
+
+        return data
+
     def update(self, X: pd.DataFrame, new_date: datetime):
+        # a node shared by several children is updated once per date
+        if new_date == self.update_date:
+            return self.last_update
+
         self.end_date = new_date
 
         if self.parents is None:
@@ -256,7 +278,7 @@ class DataNode:
 
             if num_of_new_candle_batches > 0:
                 new_data = LocalTSUploader.new_candles[self.ticker][-num_of_new_candle_batches:]
-                new_data = pd.concat(new_data)
+                new_data = new_data[0] if len(new_data) == 1 else pd.concat(new_data)
 
                 if self.remove_session:
                     new_data = RemoveSession(
@@ -265,46 +287,99 @@ class DataNode:
                         remove_session=self.remove_session
                     ).transform(new_data)
 
-                self.new_data.append(new_data)
+                self._append(new_data)
             else:
-                if len(self.new_data) == 0:
+                if self.last_new_data is None:
                     new_data = []
                 else:
-                    new_data = self.new_data[-1]
+                    new_data = self.last_new_data
         else:
             data = []
 
             for parent in self.parents:
-                updated_data = parent.update(new_date)
+                updated_data = parent.update(X, new_date)
 
                 if len(updated_data) == 0:
-                    return []
+                    new_data = []
+
+                    break
 
                 data.append(updated_data)
+            else:
+                new_parent_data = pd.concat(data, axis=1, join='inner')
+                new_data = self.transformer.transform(new_parent_data)
 
-            new_parent_data = pd.concat(data, axis=1, join='inner')
-            new_data = self.transformer.transform(new_parent_data)
+                if self.prefix is not None:
+                    new_data = new_data.add_prefix(self.prefix)
 
-            if self.prefix is not None:
-                new_data = new_data.add_prefix(self.prefix)
+                self._append(new_data)
 
-            self.new_data.append(new_data)
+        self.update_date = new_date
+        self.last_update = new_data
 
         return new_data
 
+    # rows added by update go to a buffer of the data of the node, so they are not concatenated with the
+    # whole history; the buffer keeps the last retention rows only if retention is set
+    def _append(self, new_data: pd.DataFrame):
+        if self.buffer is None:
+            self.buffer = FrameBuffer(
+                self.data if self.data is not None else new_data.iloc[:0],
+                retention=self.retention
+            )
+
+        self.buffer.append(new_data)
+        self.last_new_data = new_data
+
     def cache_new_data(self):
-        self.data = pd.concat([self.data] + self.new_data)
+        if self.buffer is not None:
+            self.data = self.buffer.frame()
+
+        self.last_new_data = None
         self.n_of_new_data_processed = 0
-        self.new_data = []
+
+    # transformers of the chain of first parents ending with the node, from the candles down
+    def chain_transformers(self) -> list:
+        if self.parents is None:
+            return []
+
+        return self.parents[0].chain_transformers() + [self.transformer]
 
     def drop_data(self):
         self.data = None
-        self.new_data = []
+        self.buffer = None
+        self.last_new_data = None
 
         if self.parents is not None:
             for parent in self.parents:
                 parent.drop_data()
 
+    # class and parameters of the transformer, which unlike its repr are never abbreviated
+    def _transformer_description(self):
+        if self.transformer is None:
+            return 'Candle'
+        elif hasattr(self.transformer, 'get_params'):
+            return [type(self.transformer).__qualname__, sorted(self.transformer.get_params(deep=True).items())]
+        else:
+            return repr(self.transformer)
+
+    def structural_hash(self) -> str:
+        """Hash of what the node computes: its transformer, prefix, ticker, removed sessions and parents.
+
+        Unlike hash or id, it is the same for identical nodes of different pipelines and processes.
+        """
+        parents = [] if self.parents is None else [parent.structural_hash() for parent in self.parents]
+
+        description = json.dumps([
+            self._transformer_description(),
+            self.prefix,
+            self.ticker.ticker_sign,
+            self.remove_session,
+            parents,
+        ], default=repr)
+
+        return hashlib.sha1(description.encode()).hexdigest()
+
     def __eq__(self, other: 'DataNode'):
         return ((repr(self.transformer) == repr(other.transformer))
                 and (self.parents == other.parents)
@@ -317,3 +392,140 @@ class DataNode:
             return 'Candle'
         else:
             return repr(self.transformer)
+
+
+def datanode_chain(
+        ticker: Ticker,
+        steps: list,
+        prefix: str = None,
+        remove_session: list[str] = None,
+) -> DataNode:
+    """Builds a chain of nodes applying the transformers of steps in turn to the candles of ticker.
+
+    Returns the final node of the chain, whose output columns get prefix. Chains of several pipelines
+    are meant to be merged by merge_datanodes, so the steps they have in common are computed once.
+    """
+    node = DataNode(ticker=ticker, remove_session=remove_session)
+
+    for step in steps:
+        new_node = DataNode(ticker=ticker, transformer=step, parents=[node])
+        node.children.append(new_node)
+        node = new_node
+
+    node.prefix = prefix
+
+    return node
+
+
+def merge_datanodes(final_datanodes: list[DataNode]) -> tuple[list[DataNode], int]:
+    """Merges the identical nodes of the graphs ending at final_datanodes.
+
+    Nodes with the same structural hash and end date compute the same data, so each of them is replaced
+    by the first one found, which gets their children: its data is computed once and shared by every
+    child, both by fit and by update. Graphs are meant to be merged before they are fitted.
+    Returns the final nodes of the merged graph and the number of nodes collapsed.
+    """
+    canonical_nodes: dict[tuple[str, datetime], DataNode] = {}
+    merged_nodes: dict[int, DataNode] = {}
+    n_collapsed = 0
+
+    def merge(node: DataNode) -> DataNode:
+        nonlocal n_collapsed
+
+        if id(node) in merged_nodes:
+            return merged_nodes[id(node)]
+
+        if node.parents is not None:
+            node.parents = [merge(parent) for parent in node.parents]
+
+        key = (node.structural_hash(), node.end_date)
+
+        if key in canonical_nodes:
+            merged_node = canonical_nodes[key]
+            n_collapsed += 1
+        else:
+            merged_node = canonical_nodes[key] = node
+
+            for parent in node.parents or []:
+                if not any(child is node for child in parent.children):
+                    parent.children.append(node)
+
+        merged_nodes[id(node)] = merged_node
+
+        return merged_node
+
+    merged_final_datanodes = []
+
+    for final_datanode in final_datanodes:
+        merged_final_datanode = merge(final_datanode)
+
+        if not any(node is merged_final_datanode for node in merged_final_datanodes):
+            merged_final_datanodes.append(merged_final_datanode)
+
+    return merged_final_datanodes, n_collapsed
+
+
+class DataNodeUnion(TransformerMixin, BaseEstimator):
+    """Transformer joining the outputs of chains of transformers applied to the candles of ticker.
+
+    Each chain of chains is a list of transformers applied in turn, the columns of its output get the
+    prefix at the same position of prefixes and the outputs are joined on their common index. Chains are
+    run as DataNodes merged by merge_datanodes, so the steps they have in common are computed once, and
+    fit goes through DataNode.cache when it is set. As a step of a TSPipeline it is saved with the model
+    it feeds, so the snapshot turns raw candles into the columns the model was fitted on.
+    """
+
+    def __init__(self, ticker: Ticker, chains: list[list], prefixes: list[str] = None):
+        self.ticker = ticker
+        self.chains = chains
+        self.prefixes = prefixes
+
+        self._fitted_chains: list[tuple[list, str]] = None
+
+    def _final_datanodes(self, chains: list[tuple[list, str]], fitted: bool) -> list[DataNode]:
+        final_datanodes = []
+
+        for steps, prefix in chains:
+            final_datanodes.append(datanode_chain(self.ticker, steps, prefix=prefix))
+
+            node = final_datanodes[-1]
+            while node.parents is not None:
+                node.fitted = fitted
+                node = node.parents[0]
+
+        return merge_datanodes(final_datanodes)[0]
+
+    @staticmethod
+    def _join(final_datanodes: list[DataNode], X: pd.DataFrame) -> pd.DataFrame:
+        return pd.concat(
+            [final_datanode.fit(X, end_date=X.index.max()) for final_datanode in final_datanodes],
+            axis=1,
+            join='inner'
+        )
+
+    def fit(self, X: pd.DataFrame, y=None):
+        self.fit_transform(X)
+
+        return self
+
+    def fit_transform(self, X: pd.DataFrame, y=None, **fit_params):
+        prefixes = [None] * len(self.chains) if self.prefixes is None else self.prefixes
+
+        final_datanodes = self._final_datanodes(
+            [([clone(step) for step in steps], prefix) for steps, prefix in zip(self.chains, prefixes)],
+            fitted=False
+        )
+        data = self._join(final_datanodes, X)
+
+        # nodes loaded from the cache hold the transformers of the cache, not the clones
+        self._fitted_chains = [
+            (final_datanode.chain_transformers(), final_datanode.prefix) for final_datanode in final_datanodes
+        ]
+
+        return data
+
+    def transform(self, X: pd.DataFrame) -> pd.DataFrame:
+        return self._join(self._final_datanodes(self._fitted_chains, fitted=True), X)
+
+    def __sklearn_is_fitted__(self):
+        return self._fitted_chains is not None
@@ -1,10 +1,10 @@
-from torchgen.executorch.api.et_cpp import returns_type
-
 from engine.strategies.strategy import Strategy
 from engine.strategies.datatypes import LocalOrder
 from engine.schemas.enums import SessionPeriod, OrderType, OrderDirection, OrderExecutionReportStatus
 from engine.schemas.datatypes import Ticker
-from engine.schemas.pipeline import Pipeline
+from engine.schemas.pipeline import TSPipeline
+from engine.candles.candles_uploader import LocalTSUploader
+from engine.walk_forward import predict_states
 from engine.transformers.returns import Returns
 import numpy as np
 
@@ -44,6 +44,7 @@ class AvgState(Strategy):
         self._threshold_price = None
         self._num_of_order = None
         self._ticker_state: dict = None
+        self._predicted_state: dict = None
 
         self._states_to_buy = states_to_buy
         self._states_to_sell = states_to_sell
@@ -108,6 +109,7 @@ class AvgState(Strategy):
             self._threshold_price = {ticker: np.inf for ticker in self.tickers_collection}
             self._num_of_order = {ticker: 0 for ticker in self.tickers_collection}
             self._ticker_state = {ticker: 'calm' for ticker in self.tickers_collection}
+            self._predicted_state = {ticker: 'calm' for ticker in self.tickers_collection}
 
         def create_averaging_orders(
                 ticker: Ticker,
@@ -188,10 +190,9 @@ class AvgState(Strategy):
 
         if not self._executed:
             self._ticker_pipelines = {
-                ticker: Pipeline(
+                ticker: TSPipeline(
                     path=self._path_to_model,
-                    end_date=self._period.time_period,
-                    ticker=ticker,
+                    train_split_date=self._period.time_period,
                 ) for ticker in self.tickers_collection
             }
 
@@ -211,11 +212,22 @@ class AvgState(Strategy):
         ## updating info on candles
 
         for ticker in self._tickers_for_candle_fetching:
+            pipeline = self._ticker_pipelines[ticker]
+
+            # models retrained by a walk-forward run take over at their fit dates
+            if self._period.time_period >= pipeline.next_cached_model_date:
+                pipeline.reload_model(self._path_to_model, self._period.time_period)
+
             new_candles_supplied = self._services.get_candles(ticker)
 
             if new_candles_supplied:
-                self._ticker_state[ticker] = self._ticker_pipelines[ticker].predict(
-                    new_date=self._period.time_period)[-1]
+                states = predict_states(pipeline, LocalTSUploader.last_candles[ticker])
+
+                # candles the features drop, e.g. with zero activity, leave the last prediction in force
+                if len(states) > 0:
+                    self._predicted_state[ticker] = states.iloc[-1]
+
+                self._ticker_state[ticker] = self._predicted_state[ticker]
 
         ## selecting new tickers for new trade
 
@@ -0,0 +1,247 @@
+from engine.schemas.enums import SessionPeriod, OrderDirection
+from engine.schemas.datatypes import Ticker, ExchangeCalendar, get_exchange_calendar
+from engine.schemas.mock_client import MockClient
+from engine.candles.candles_uploader import LocalTSUploader
+import pandas as pd
+import numpy as np
+from decimal import Decimal
+from typing import Type, Callable
+
+
+# returns the first index in [start, stop) at which condition(start, end) is true, or stop if there is none;
+# windows grow geometrically, so the cost is proportional to the distance to the answer, not to stop
+def _first_true(condition: Callable[[int, int], np.ndarray], start: int, stop: int, window: int = 64) -> int:
+    while start < stop:
+        end = min(start + window, stop)
+        hits = condition(start, end)
+
+        if hits.any():
+            return start + int(hits.argmax())
+
+        start, window = end, window * 2
+
+    return stop
+
+
+class VectorizedAvgState:
+    """Single-pass backtest of AvgState on precomputed states.
+
+    Replays the orders AvgState (num_of_averaging=1, one ticker) posts to a MockClient built with
+    client_config: a market order and a limit take-profit on entry, a market stop-loss order when the
+    threshold is crossed. Instead of stepping the event loop minute by minute, the exit of every trade
+    and the next entry are searched on the OHLC arrays, so the cost grows with the number of trades.
+    Candles are assumed to cover every open minute, as the event loop advances one candle per minute,
+    and prices are assumed to be quoted to nano precision, as they are by the brokers.
+    """
+
+    def __init__(
+            self,
+            client_constructor: Type[MockClient],
+            client_config: dict,
+            cash_share: float = 1,
+            return_threshold_up=10,
+            return_threshold_down=10,
+            states_to_buy=('bull'),
+            states_to_sell=('bear'),
+            sessions=(SessionPeriod.MAIN,),
+            include_opening=True,
+            include_closing=True,
+    ):
+        self._price_correction = client_constructor.price_correction
+        self._bid_orderbook_price = client_config.get('bid_orderbook_price', 'low')
+        self._ask_orderbook_price = client_config.get('ask_orderbook_price', 'high')
+        self._market_order_price = client_config.get('market_order_price', 'open')
+        self._buy_price_end_period = client_config.get('buy_price_end_period', 'low')
+        self._sell_price_end_period = client_config.get('sell_price_end_period', 'high')
+        self._initial_cash = client_config.get('cash', 100000)
+
+        self._cash_share = cash_share
+        self._return_threshold_up = return_threshold_up
+        self._return_threshold_down = return_threshold_down
+        self._states_to_buy = (states_to_buy,) if isinstance(states_to_buy, str) else tuple(states_to_buy)
+        self._states_to_sell = (states_to_sell,) if isinstance(states_to_sell, str) else tuple(states_to_sell)
+        self._sessions = sessions
+        self._include_opening = include_opening
+        self._include_closing = include_closing
+
+        self.cash = None
+        self.profits = []
+        self.trades: pd.DataFrame = None
+
+    # same as MockClient.current_price, for all candles at once
+    @staticmethod
+    def _prices(candles: pd.DataFrame, price_type: str) -> np.ndarray:
+        if price_type == 'mid':
+            return (candles['low'].to_numpy(dtype=np.float64) + candles['high'].to_numpy(dtype=np.float64)) / 2
+        else:
+            return candles[price_type].to_numpy(dtype=np.float64)
+
+    # prices at which orders are filled in nano units, the Decimal prices of MockClient._fill_prices times 10**9
+    @staticmethod
+    def _fill_prices(candles: pd.DataFrame, price_type: str) -> np.ndarray:
+        if price_type == 'mid':
+            return (np.rint(candles['high'].to_numpy(dtype=np.float64) * 1e9)
+                    + np.rint(candles['low'].to_numpy(dtype=np.float64) * 1e9)) / 2
+        else:
+            return np.rint(candles[price_type].to_numpy(dtype=np.float64) * 1e9)
+
+    @staticmethod
+    def _fill_price(candles: pd.DataFrame, price_type: str, idx: int) -> Decimal:
+        if price_type == 'mid':
+            return (round(Decimal(float(candles['high'].iat[idx])), 9)
+                    + round(Decimal(float(candles['low'].iat[idx])), 9)) / 2
+        else:
+            return round(Decimal(float(candles[price_type].iat[idx])), 9)
+
+    # minutes at which TMockClient.ready_to_trade lets the strategy run
+    def _tradable(self, ticker: Ticker, index: pd.DatetimeIndex) -> np.ndarray:
+        calendar = get_exchange_calendar(LocalTSUploader.broker, ticker.type_instrument)
+        minutes = ExchangeCalendar.to_minutes(index)
+
+        if len(calendar.minutes) == 0:
+            return np.zeros(len(minutes), dtype=bool)
+
+        idx = np.minimum(np.searchsorted(calendar.minutes, minutes), len(calendar.minutes) - 1)
+        is_open = calendar.minutes[idx] == minutes
+
+        tradable = is_open & np.isin(calendar.sessions[idx], [session.value for session in self._sessions])
+
+        if not self._include_opening:
+            tradable &= calendar.auctions[idx] != ExchangeCalendar.OPENING
+        if not self._include_closing:
+            tradable &= calendar.auctions[idx] != ExchangeCalendar.CLOSING
+
+        return tradable
+
+    # same as AvgState._determine_lots with num_of_averaging=1
+    def _determine_lots(self, ticker: Ticker, cash: float, direction: OrderDirection, price: float) -> int:
+        if direction == OrderDirection.ORDER_DIRECTION_BUY:
+            lots = cash * 1.0 // price
+        else:
+            lots = -1 * cash * 1.0 // price
+
+        if lots > 0:
+            return int(lots // ticker.lot)
+        else:
+            return int(abs(lots + (lots % ticker.lot)) // ticker.lot)
+
+    def run(
+            self,
+            ticker: Ticker,
+            candles: pd.DataFrame,
+            states,
+            tradable: np.ndarray = None,
+    ) -> pd.DataFrame:
+        """Backtests the strategy on candles, states[i] being the state predicted after candle i.
+
+        states is either aligned with candles or a pd.Series indexed by time, in which case the last
+        known state is used at every candle. tradable masks the candles at which the strategy is run and
+        defaults to the minutes of the sessions of the strategy. Returns the trades; the resulting cash
+        of the mock account is stored in cash and the profits reported by AvgState in profits.
+        """
+        if isinstance(states, pd.Series):
+            states = states.reindex(candles.index, method='ffill')
+
+        states = np.asarray(states, dtype=object)
+
+        if tradable is None:
+            tradable = self._tradable(ticker, candles.index)
+
+        bid = self._prices(candles, self._bid_orderbook_price)
+        ask = self._prices(candles, self._ask_orderbook_price)
+        buy_fill = self._fill_prices(candles, self._buy_price_end_period)
+        sell_fill = self._fill_prices(candles, self._sell_price_end_period)
+
+        tradable_idx = np.flatnonzero(tradable)
+        entries_buy = tradable & np.isin(states, self._states_to_buy)
+        entries = np.flatnonzero(entries_buy | (tradable & np.isin(states, self._states_to_sell)))
+
+        up, down = self._return_threshold_up / 10000, self._return_threshold_down / 10000
+        n = len(candles)
+        cash = self._initial_cash
+        trades = []
+        self.profits = []
+        start = 0
+
+        while True:
+            k = np.searchsorted(entries, start)
+
+            if k == len(entries):
+                break
+
+            entry = int(entries[k])
+
+            if entries_buy[entry]:
+                direction, sign = OrderDirection.ORDER_DIRECTION_BUY, 1
+                price = bid[entry]
+                desired_price = price * (1 + up)
+                threshold = price * (1 - down)
+            else:
+                direction, sign = OrderDirection.ORDER_DIRECTION_SELL, -1
+                price = ask[entry]
+                desired_price = price * (1 - down)
+                threshold = price * (1 + up)
+
+            lots = self._determine_lots(ticker, cash * self._cash_share, direction, price)
+            market_price = self._price_correction(price, ticker)
+            desired_price = round(self._price_correction(desired_price, ticker), 9)
+
+            p_market = self._fill_price(candles, self._market_order_price, entry)
+            cash += float(lots * p_market * ticker.lot * -sign)
+
+            # the stop-loss is checked at the tradable minutes after the entry
+            first = np.searchsorted(tradable_idx, entry, side='right')
+            stops = tradable_idx[first:]
+
+            if sign == 1:
+                s = _first_true(lambda a, b: bid[stops[a:b]] <= threshold, 0, len(stops))
+            else:
+                s = _first_true(lambda a, b: -ask[stops[a:b]] <= -threshold, 0, len(stops))
+
+            stop = int(stops[s]) if s < len(stops) else n
+
+            # the take-profit is cancelled at the minute of the stop-loss, before the candle fills it
+            desired_nano = float(desired_price * 10 ** 9)
+
+            if sign == 1:
+                d = _first_true(lambda a, b: desired_nano <= sell_fill[a:b], entry, stop)
+            else:
+                d = _first_true(lambda a, b: desired_nano >= buy_fill[a:b], entry, stop)
+
+            if d < stop:
+                exit_, exit_type, exit_price = d, 'desired', desired_price
+                exit_order_price = float(desired_price)
+            elif stop < n:
+                exit_, exit_type = stop, 'unwanted'
+                exit_price = self._fill_price(candles, self._market_order_price, stop)
+                exit_order_price = float(self._price_correction(
+                    ask[stop] * (1 - down) if sign == 1 else bid[stop] * (1 + up), ticker
+                ))
+            else:
+                trades.append([candles.index[entry], pd.NaT, direction, lots, float(p_market), np.nan, None, np.nan])
+                break
+
+            cash += float(lots * exit_price * ticker.lot * sign)
+
+            profit = 0
+            profit += -sign * float(market_price) * lots * ticker.lot
+            profit += sign * exit_order_price * lots * ticker.lot
+
+            # AvgState reports the profit when it learns about the fill, at the next tradable minute
+            if np.searchsorted(tradable_idx, exit_, side='right') < len(tradable_idx):
+                self.profits.append(profit)
+            else:
+                profit = np.nan
+
+            trades.append([candles.index[entry], candles.index[exit_], direction, lots,
+                           float(p_market), float(exit_price), exit_type, profit])
+
+            start = exit_ + 1
+
+        self.cash = cash
+        self.trades = pd.DataFrame(
+            trades,
+            columns=['entry_time', 'exit_time', 'direction', 'lots', 'entry_price', 'exit_price', 'exit', 'profit']
+        )
+
+        return self.trades
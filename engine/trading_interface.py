@@ -60,3 +60,5 @@ class TradingInterface:
                         if strategy.active:
                             strategy.terminate()
                             number_of_inactive_strategies += 1
+
+            return client.get_available_balance(client.get_account(self._account))
@@ -3,6 +3,7 @@ from typing import Callable
 import pandas as pd
 import numpy as np
 from datetime import timedelta
+from collections import deque
 
 
 class Returns(TransformerMixin, BaseEstimator):
@@ -18,9 +19,11 @@ class Returns(TransformerMixin, BaseEstimator):
         self.day_number = day_number
         self.keep_vol = keep_vol
         self.last_candle: pd.DataFrame = None
+        self._last_values: tuple = None
 
     def fit(self, X, y=None, **kwargs):
         self.last_candle: pd.DataFrame = None
+        self._last_values = None
 
         return self
 
@@ -30,6 +33,13 @@ class Returns(TransformerMixin, BaseEstimator):
             if isinstance(X[0], pd.DataFrame):
                 X = pd.concat(X)
 
+        # the last candle was passed to update, so it only exists as values
+        if self._last_values is not None:
+            self.last_candle = pd.DataFrame(
+                [self._last_values], columns=self.candle_columns, index=X.index[:1]
+            ).astype(X.dtypes[list(self.candle_columns)].to_dict())
+            self._last_values = None
+
         if self.last_candle is not None:
             X = pd.concat([self.last_candle, X])
 
@@ -69,11 +79,56 @@ class Returns(TransformerMixin, BaseEstimator):
 
         return returns
 
+    candle_columns = ('open', 'high', 'low', 'close', 'volume', 'day_number')
+
+    def _price(self, open, high, low, close):
+        if self.candle_to_price == 'mean':
+            return np.log((np.float64(high) + np.float64(low)) / 2)
+        else:
+            return np.log(np.float64({'open': open, 'high': high, 'low': low, 'close': close}[self.candle_to_price]))
+
+    def update(self, open, high, low, close, volume, day_number):
+        """Returns the row transform would return for a single new candle, or None if transform would drop it.
+
+        Only the previous candle is kept, so every update costs the same whatever the history; updates and
+        transform calls can be interleaved. The row holds the returns (high and low for two_way), then
+        day_number and volume if they are kept, and equals the row of transform to the last bit.
+        """
+        if self._last_values is not None:
+            previous = self._last_values
+        elif self.last_candle is not None:
+            previous = tuple(self.last_candle[column].iat[-1] for column in self.candle_columns)
+        else:
+            previous = None
+
+        self._last_values = (open, high, low, close, volume, day_number)
+
+        if previous is None:
+            return None
+
+        if not self.keep_overnight and day_number - previous[5] != 0:
+            return None
+
+        if self.candle_to_price != 'two_way':
+            row = (self._price(open, high, low, close) - self._price(*previous[:4]),)
+        else:
+            previous_close = np.log(np.float64(previous[3]))
+            row = (np.log(np.float64(high)) - previous_close, np.log(np.float64(low)) - previous_close)
+
+        if self.day_number:
+            row += (day_number,)
+
+        if self.keep_vol:
+            row += (volume,)
+
+        return row
+
     def save_model(self):
         return self
 
     def load_model(self, data):
         self.last_candle = data['last_candle']
+        self._last_values = None
 
 
 class CandlesToDirection(TransformerMixin, BaseEstimator):
@@ -88,9 +143,11 @@ class CandlesToDirection(TransformerMixin, BaseEstimator):
         self.periods = periods
 
         self.last_candles = pd.DataFrame([])
+        self._window: deque = None
 
     def fit(self, X, y=None):
         self.last_candles = pd.DataFrame([])
+        self._window = None
 
         return self
 
@@ -99,6 +156,14 @@ class CandlesToDirection(TransformerMixin, BaseEstimator):
             if isinstance(X[0], pd.DataFrame):
                 X = pd.concat(X)
 
+        # the last candles were passed to update, so they only exist in the window
+        if self._window is not None:
+            last_candles = list(self._window)[1:] if len(self._window) == self.periods else list(self._window)
+            self.last_candles = pd.DataFrame(
+                last_candles, columns=['open', 'high', 'low'], index=X.index[[0] * len(last_candles)]
+            )
+            self._window = None
+
         if len(self.last_candles) > 0:
             X = pd.concat([self.last_candles, X])
 
@@ -125,3 +190,52 @@ class CandlesToDirection(TransformerMixin, BaseEstimator):
             self.last_candles = X.iloc[-self.periods + 1:]
 
         return y.to_frame()
+
+    def _push(self, open, high, low):
+        n = self._n
+        self._n += 1
+
+        self._window.append((open, high, low))
+
+        # monotonic deques of (position, price): the maximum high and the minimum low
+        # of the window are at their fronts
+        while self._highs and self._highs[-1][1] <= high:
+            self._highs.pop()
+        self._highs.append((n, high))
+
+        while self._lows and self._lows[-1][1] >= low:
+            self._lows.pop()
+        self._lows.append((n, low))
+
+        if self._highs[0][0] <= n - self.periods:
+            self._highs.popleft()
+        if self._lows[0][0] <= n - self.periods:
+            self._lows.popleft()
+
+    def update(self, open, high, low):
+        """Returns the direction of the window of periods candles ending with the new one, or None if fewer
+        candles were seen.
+
+        The window is kept in a ring buffer with monotonic deques of its highs and lows, so every update
+        costs constant time; updates and transform calls can be interleaved and agree with each other.
+        """
+        if self._window is None:
+            self._window = deque(maxlen=self.periods)
+            self._highs, self._lows = deque(), deque()
+            self._n = 0
+
+            if len(self.last_candles) > 0:
+                for candle in self.last_candles[['open', 'high', 'low']].itertuples(index=False):
+                    self._push(*candle)
+
+        self._push(open, high, low)
+
+        if len(self._window) < self.periods:
+            return None
+
+        log_open = np.log(np.float64(self._window[0][0]))
+        direction_bull = (np.log(np.float64(self._highs[0][1])) - log_open) * 10000
+        direction_bear = (np.log(np.float64(self._lows[0][1])) - log_open) * 10000
+
+        return (int((direction_bull > self.bull_threshold) and (direction_bull > -direction_bear))
+                + 2 * int((direction_bear < self.bear_threshold) and (direction_bear < -direction_bull)))
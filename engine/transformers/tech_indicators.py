@@ -1,6 +1,18 @@
 from sklearn.base import TransformerMixin, BaseEstimator
-from statsmodels.tsa.api import SimpleExpSmoothing
+from scipy.signal import lfilter
 import pandas as pd
+import numpy as np
+
+
+def ema(x: np.ndarray, alpha: float, initial_level: float) -> np.ndarray:
+    """Exponential smoothing l_t = alpha * x_t + (1 - alpha) * l_{t-1} started at initial_level.
+
+    Returns initial_level followed by the levels after every x_t, as the fittedfcast of a
+    SimpleExpSmoothing with a fixed smoothing level, and is equal to it to the last bit.
+    """
+    levels, _ = lfilter([alpha], [1, alpha - 1], np.asarray(x, dtype=np.float64), zi=[(1 - alpha) * initial_level])
+
+    return np.concatenate([[initial_level], levels])
 
 
 class RSI(TransformerMixin, BaseEstimator):
@@ -12,6 +24,7 @@ class RSI(TransformerMixin, BaseEstimator):
         self.periods = periods
         self.ma = ma
         self.initial_level: dict = {}
+        self._last_close: float = None
 
     def fit(self, X):
         if type(X) is list:
@@ -36,13 +49,8 @@ class RSI(TransformerMixin, BaseEstimator):
 
         U, D = price_diff * (price_diff > 0), -1 * price_diff * (price_diff < 0)
 
-        SEMA_U = SimpleExpSmoothing(U.iloc[self.periods:].to_numpy(), initialization_method='known',
-                                    initial_level=self.initial_level['U'])
-        SEMA_D = SimpleExpSmoothing(D.iloc[self.periods:].to_numpy(), initialization_method='known',
-                                    initial_level=self.initial_level['D'])
-
-        SEMA_U = SEMA_U.fit(smoothing_level=1 / self.periods, optimized=False).fittedfcast
-        SEMA_D = SEMA_D.fit(smoothing_level=1 / self.periods, optimized=False).fittedfcast
+        SEMA_U = ema(U.iloc[self.periods:].to_numpy(), 1 / self.periods, self.initial_level['U'])
+        SEMA_D = ema(D.iloc[self.periods:].to_numpy(), 1 / self.periods, self.initial_level['D'])
 
         RS = SEMA_U / SEMA_D
 
@@ -51,9 +59,26 @@ class RSI(TransformerMixin, BaseEstimator):
 
         self.initial_level['U'] = SEMA_U[-1]
         self.initial_level['D'] = SEMA_D[-1]
+        self._last_close = X['close'].iloc[-1]
 
         return RSI
 
+    def update(self, close):
+        """Returns the RSI after a new close, carrying on from the levels left by transform or update."""
+        if self._last_close is None:
+            raise ValueError('RSI.update needs the levels left by transform, call transform first.')
+
+        price_diff = close - self._last_close
+        self._last_close = close
+
+        U, D = price_diff * (price_diff > 0), -1 * price_diff * (price_diff < 0)
+        alpha = 1 / self.periods
+
+        self.initial_level['U'] = alpha * U + (1 - alpha) * self.initial_level['U']
+        self.initial_level['D'] = alpha * D + (1 - alpha) * self.initial_level['D']
+
+        return 100 - 100 / (1 + self.initial_level['U'] / self.initial_level['D'])
+
 
 class EMA(TransformerMixin, BaseEstimator):
     def __init__(
@@ -61,6 +86,7 @@ class EMA(TransformerMixin, BaseEstimator):
             periods=14
     ):
         self.periods = periods
+        self.level: float = None
 
     def fit(self, X):
         return self
@@ -68,16 +94,24 @@ class EMA(TransformerMixin, BaseEstimator):
     def transform(self, X):
         price = X['close']
 
-        EMA = pd.Series(SimpleExpSmoothing(
-            price.iloc[self.periods:].to_numpy(),
-            initialization_method='known',
-            initial_level=price.iloc[:self.periods].mean()
-        ).fit().fittedfcast, name='EMA')
+        levels = ema(price.iloc[self.periods:].to_numpy(), 2 / (self.periods + 1), price.iloc[:self.periods].mean())
+        self.level = levels[-1]
 
+        EMA = pd.Series(levels, name='EMA')
         EMA.index = price.index[self.periods - 1:]
 
         return EMA
 
+    def update(self, close):
+        """Returns the EMA after a new close, carrying on from the level left by transform or update."""
+        if self.level is None:
+            raise ValueError('EMA.update needs the level left by transform, call transform first.')
+
+        alpha = 2 / (self.periods + 1)
+        self.level = alpha * close + (1 - alpha) * self.level
+
+        return self.level
+
 
 class EMATrendIdentifier(TransformerMixin, BaseEstimator):
     def __init__(
@@ -85,6 +119,7 @@ class EMATrendIdentifier(TransformerMixin, BaseEstimator):
             periods=14
     ):
         self.periods = periods
+        self.level: float = None
 
     def fit(self, X):
         return self
@@ -92,12 +127,21 @@ class EMATrendIdentifier(TransformerMixin, BaseEstimator):
     def transform(self, X):
         price = X['close']
 
-        EMA = pd.Series(SimpleExpSmoothing(
-            price.iloc[self.periods:].to_numpy(),
-            initialization_method='known',
-            initial_level=price.iloc[:self.periods].mean()
-        ).fit().fittedvalues, name='EMA')
+        levels = ema(price.iloc[self.periods:].to_numpy(), 2 / (self.periods + 1), price.iloc[:self.periods].mean())
+        self.level = levels[-1]
 
+        EMA = pd.Series(levels[:-1], name='EMA')
         EMA.index = price.index[self.periods:]
 
         return (price.iloc[self.periods:] - EMA) > 0
+
+    def update(self, close):
+        """Returns whether a new close is above the EMA of the previous closes, then updates the EMA."""
+        if self.level is None:
+            raise ValueError('EMATrendIdentifier.update needs the level left by transform, call transform first.')
+
+        alpha = 2 / (self.periods + 1)
+        trend = (close - self.level) > 0
+        self.level = alpha * close + (1 - alpha) * self.level
+
+        return trend
@@ -0,0 +1,146 @@
+from engine.schemas.pipeline import TSPipeline
+from engine.schemas.model_registry import ModelRegistry
+from engine.schemas.datatypes import Broker, Ticker
+from engine.schemas.constants import data_path
+from engine.candles.candles_uploader import LocalTSUploader, ColumnarTSUploader
+from engine.strategies.vectorized import VectorizedAvgState
+import pandas as pd
+import os
+from copy import deepcopy
+from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor
+
+
+def _init_worker(broker: Broker):
+    LocalTSUploader.broker = broker
+
+
+def _memmap_candles(ticker_sign: str) -> pd.DataFrame:
+    return ColumnarTSUploader(
+        data_path + f'{LocalTSUploader.broker.broker_name}/{ticker_sign}/candles_1min'
+    ).memmap_ts()
+
+
+# fits a copy of the unfitted pipeline on the candles of (fit_date - train_window, fit_date] and saves it
+def _fit_snapshot(
+        pipeline: TSPipeline,
+        ticker_sign: str,
+        fit_date: datetime,
+        train_window: timedelta,
+        path: str,
+) -> str:
+    candles = _memmap_candles(ticker_sign)
+    candles = candles[(fit_date - train_window < candles.index) & (candles.index <= fit_date)]
+
+    snapshot = deepcopy(pipeline)
+    snapshot.fit(candles)
+    snapshot.fit_date = fit_date
+    snapshot.save(path)
+
+    return path + ModelRegistry.file_name(fit_date)
+
+
+def predict_states(pipeline: TSPipeline, X: pd.DataFrame) -> pd.Series:
+    """Returns the predictions of the pipeline indexed by the candles they were made at."""
+    X = pipeline[:-1].transform(X)
+
+    # a batch of candles the features dropped entirely, e.g. with zero activity only, has no states
+    if len(X) == 0:
+        return pd.Series([], index=X.index, dtype=object)
+
+    prediction = pipeline[-1].predict(X)
+
+    return pd.Series(prediction, index=X.index[-len(prediction):])
+
+
+class WalkForward:
+    """Walk-forward retraining and backtest of a TSPipeline.
+
+    Every retrain_every from start_date to end_date, a copy of the unfitted pipeline is fitted on the
+    preceding train_window of candles and saved with TSPipeline.save, so the snapshots at path follow
+    the naming TSPipeline(path=...) loads from. Snapshots are fitted in parallel processes and the ones
+    already saved are kept, so an interrupted training is resumed by running it again.
+
+    The backtest then walks through the boundaries with a single pipeline that reload_model swaps for
+    the next snapshot at each boundary, the way a strategy holding the pipeline would see it.
+    """
+
+    def __init__(
+            self,
+            pipeline: TSPipeline,
+            ticker: Ticker,
+            path: str,
+            start_date: datetime,
+            end_date: datetime,
+            retrain_every: timedelta = timedelta(weeks=1),
+            train_window: timedelta = timedelta(weeks=52),
+            predict_lookback: timedelta = timedelta(days=1),
+            n_jobs: int = None,
+    ):
+        self.pipeline = pipeline
+        self.ticker = ticker
+        self.path = path
+        self.start_date = start_date
+        self.end_date = end_date
+        self.retrain_every = retrain_every
+        self.train_window = train_window
+        self.predict_lookback = predict_lookback
+        self.n_jobs = n_jobs if n_jobs is not None else os.cpu_count()
+
+    def boundaries(self) -> list[datetime]:
+        dates = []
+        date = self.start_date
+
+        while date < self.end_date:
+            dates.append(date)
+            date += self.retrain_every
+
+        return dates
+
+    def snapshot_path(self, fit_date: datetime) -> str:
+        return self.path + ModelRegistry.file_name(fit_date)
+
+    def train(self) -> list[str]:
+        pending = [date for date in self.boundaries() if not os.path.isfile(self.snapshot_path(date))]
+
+        if len(pending) > 0:
+            with ProcessPoolExecutor(
+                    max_workers=min(self.n_jobs, len(pending)),
+                    initializer=_init_worker,
+                    initargs=(LocalTSUploader.broker,)
+            ) as executor:
+                list(executor.map(
+                    _fit_snapshot,
+                    [self.pipeline] * len(pending),
+                    [self.ticker.ticker_sign] * len(pending),
+                    pending,
+                    [self.train_window] * len(pending),
+                    [self.path] * len(pending),
+                ))
+
+            # snapshots saved concurrently may have raced on the index of the directory
+            ModelRegistry.rebuild(self.path)
+
+        return [self.snapshot_path(date) for date in self.boundaries()]
+
+    def predict(self) -> pd.Series:
+        candles = _memmap_candles(self.ticker.ticker_sign)
+        boundaries = self.boundaries()
+        pipeline = TSPipeline(path=self.path, train_split_date=boundaries[0])
+        states = []
+
+        for date, next_date in zip(boundaries, boundaries[1:] + [self.end_date]):
+            pipeline.reload_model(self.path, date)
+
+            X = candles[(date - self.predict_lookback < candles.index) & (candles.index <= next_date)]
+            window_states = predict_states(pipeline, X)
+
+            states.append(window_states[(date < window_states.index) & (window_states.index <= next_date)])
+
+        return pd.concat(states)
+
+    def backtest(self, strategy: VectorizedAvgState) -> pd.DataFrame:
+        candles = _memmap_candles(self.ticker.ticker_sign)
+        candles = candles[(self.start_date < candles.index) & (candles.index <= self.end_date)]
+
+        return strategy.run(self.ticker, candles, self.predict())
@@ -1,16 +1,16 @@
 from datetime import datetime, timezone
 
 from engine.models.hmm import HMMLearnGaussian
-from engine.schemas.pipeline import Pipeline
+from engine.hmm_restarts import HMMRestarts
+from engine.schemas.pipeline import TSPipeline, DataNode, datanode_chain
+from engine.schemas.datanode_cache import DataNodeCache
+from engine.schemas.constants import model_path, data_path, cache_path
 from engine.transformers.returns import Returns
 from sklearn.preprocessing import StandardScaler
 from engine.transformers.candles_processing import RemoveZeroActivityCandles
 from api.tinvest.tticker import TTicker
 from api.broker_list import t_invest
-from engine.candles.candles_uploader import LocalTSUploader
-from main import main
-
-from engine.strategies.state_based import AvgState
+from engine.candles.candles_uploader import LocalTSUploader, ColumnarTSUploader
 
 import sys
 import os
@@ -21,12 +21,14 @@ from sklearn import set_config
 set_config(transform_output="pandas")
 
 argv = True
+cache_features = True
 
+# n_components is either a number of states or a comma-separated list of them to sweep
 if argv:
-    n_components = int(sys.argv[2])
+    n_components = [int(n) for n in sys.argv[2].split(',')]
     n_fits = int(sys.argv[1])
 else:
-    n_components = 4
+    n_components = [4]
     n_fits = 10
 
 
@@ -39,36 +41,59 @@ t = datetime(year=2024, month=12, day=1).replace(tzinfo=timezone.utc)
 
 # model fitting
 model = HMMLearnGaussian(
-    n_components=n_components,
+    n_components=n_components[0],
     covariance_type='full',
     verbose=True,
     tol=500,
     n_iter=1000,
 )
 
-pipe = Pipeline(tick).add_nodes(
-    [
-        RemoveZeroActivityCandles(),
-        Returns(keep_overnight=False, day_number=False, candle_to_price='two_way', keep_vol=False),
-        StandardScaler(with_mean=False),
-        model,
-    ],
-    end_date=t
-)
+pipe = TSPipeline([
+    ('remove_zero_activity', RemoveZeroActivityCandles()),
+    ('returns', Returns(keep_overnight=False, day_number=False, candle_to_price='two_way', keep_vol=False)),
+    ('scaler', StandardScaler(with_mean=False)),
+    ('model', model),
+])
+
+if __name__ == '__main__':
+    candles = ColumnarTSUploader(
+        data_path + f'{t_invest.broker_name}/{tick.ticker_sign}/candles_1min'
+    ).memmap_ts()
+    candles = candles[candles.index <= t]
+
+    # features of a rerun are read from the cache, only the candles past the last run are computed
+    if cache_features:
+        DataNode.cache = DataNodeCache(cache_path)
+
+    features = datanode_chain(tick, [transformer for _, transformer in pipe.steps[:-1]])
+    X = features.fit(candles, end_date=candles.index[-1])
+
+    # transformers read from the cache take the place of the ones of the pipeline
+    pipe.steps[:-1] = [
+        (name, transformer) for (name, _), transformer in zip(pipe.steps[:-1], features.chain_transformers())
+    ]
+
+    restarts = HMMRestarts(model, n_restarts=n_fits, n_components=n_components, criterion='bic')
+    model = restarts.fit(X)
+
+    print(restarts.results_.to_string())
 
-pipe.fit(tries=n_fits, show_score=True)
+    pipe.steps[-1] = ('model', model)
+    pipe.fit_date = X.index[-1]
 
-X = pipe.final_datanodes.data.to_numpy()
-pipe.model.determine_states(X, pipe.fetch_data('Returns').sum(axis=1).to_numpy())
+    returns = pipe['scaler'].inverse_transform(X)
+    model.determine_states(X.to_numpy(), returns.sum(axis=1).to_numpy())
 
-bic = pipe.model.bic(X)
-aic = pipe.model.aic(X)
-score = pipe.model.score(X)
-ans = f'Number of states={n_components}\nAIC: {aic}\nBIC: {bic}\nScore: {score}'
+    X = X.to_numpy()
+    bic = model.bic(X)
+    aic = model.aic(X)
+    score = model.score(X)
+    ans = f'Number of states={model.n_components}\nAIC: {aic}\nBIC: {bic}\nScore: {score}'
 
-print(ans)
+    print(ans)
 
-with open(os.getcwd() + f'/ans_{n_components}_{datetime.now()}.txt', 'w') as log:
-    log.write(ans)
+    with open(os.getcwd() + f'/ans_{model.n_components}_{datetime.now()}.txt', 'w') as log:
+        log.write(ans)
+        log.write('\n\n' + restarts.results_.to_string())
 
-pipe.save()
+    pipe.save(model_path + f'{t_invest.broker_name}/{tick.ticker_sign}/{model.name}/')
@@ -0,0 +1,48 @@
+from datetime import datetime, timezone, timedelta
+from api.broker_list import t_invest
+from engine.candles.candles_uploader import LocalTSUploader
+from engine.schemas.constants import model_path, log_path
+
+from engine.strategies.state_based import AvgState
+from engine.parameter_sweep import ParameterSweep
+
+from sklearn import set_config
+set_config(transform_output="pandas")
+
+LocalTSUploader.broker = t_invest
+
+
+if __name__ == '__main__':
+    train_date = datetime(year=2024, month=12, day=2, hour=8, minute=59).replace(tzinfo=timezone.utc)
+    tickers_collection = ['SBER']
+    path_to_model = model_path + t_invest.broker_name + '/SBER/LogisticReg(return_lag=5)/'
+
+    strategy_grid = {
+        'path_to_model': [path_to_model],
+        'return_threshold_up': [5, 10, 20, 40],
+        'return_threshold_down': [5, 10, 20, 40],
+        'num_of_averaging': [1, 2],
+        'cash_share': [0.5, 0.9],
+    }
+
+    mock_client_grid = {
+        'period': [train_date + timedelta(minutes=1)],
+        'bid_orderbook_price': ['open'],
+        'ask_orderbook_price': ['open'],
+        'market_order_price': ['open'],
+        'buy_price_end_period': ['low'],
+        'sell_price_end_period': ['high'],
+        'lag_in_cached_candles': [1],
+        'skip_closed_periods': [True],
+    }
+
+    results = ParameterSweep(
+        strategy_constructor=AvgState,
+        strategy_grid=strategy_grid,
+        mock_client_grid=mock_client_grid,
+        tickers_collection=tickers_collection,
+        duration=timedelta(hours=24),
+        results_path=log_path + 'sweep_avg_state.csv',
+    ).run()
+
+    print(results.sort_values('cash', ascending=False).head(20))
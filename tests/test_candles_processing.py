@@ -0,0 +1,56 @@
+import io
+import contextlib
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip('tinkoff')
+
+from api.broker_list import t_invest
+from api.tinvest.datatypes import InstrumentType
+from engine.schemas.datatypes import Ticker
+from engine.transformers.candles_processing import CandlesRefinerTransformer
+from tests.legacy_candles_processing import fill_breaks_in_candle_data as legacy_fill_breaks_in_candle_data
+
+
+class StockTicker(Ticker):
+    type_instrument = InstrumentType.STOCK
+
+
+# minute candles of SBER shape on working days from start to end, with a share of the minutes missing
+# and the given holidays without any candle
+def make_candles(start: str, end: str, holidays: list[str], present: float, seed: int) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+
+    times = pd.date_range(start, end, freq='min', tz='UTC', name='time', inclusive='left')
+    times = times[(times.dayofweek < 5) & ~times.normalize().isin(pd.DatetimeIndex(holidays, tz='UTC'))]
+    times = times[rng.random(len(times)) < present]
+
+    close = 250 + np.cumsum(rng.normal(scale=0.05, size=len(times)))
+
+    return pd.DataFrame({
+        'open': close + rng.normal(scale=0.02, size=len(times)),
+        'high': close + 0.1,
+        'low': close - 0.1,
+        'close': close,
+        'volume': rng.integers(1, 1000, len(times)),
+    }, index=times)
+
+
+@pytest.mark.parametrize('start, end, holidays, present, seed', [
+    ('2023-11-01', '2024-02-01', ['2023-11-06', '2024-01-01', '2024-01-02', '2024-01-08'], 0.6, 0),
+    ('2024-02-01', '2024-05-15', ['2024-02-23', '2024-03-08', '2024-05-01', '2024-05-09'], 0.2, 1),
+    ('2023-03-01', '2023-05-01', [], 0.95, 2),
+])
+def test_fill_breaks_in_candle_data_matches_loop(start, end, holidays, present, seed):
+    transformer = CandlesRefinerTransformer(broker=t_invest, ticker=StockTicker(ticker_sign='SBER'), last_day_number=3)
+
+    candles = transformer.clear_redundant_candles(make_candles(start, end, holidays, present, seed))
+
+    # the loop prints its progress
+    with contextlib.redirect_stdout(io.StringIO()):
+        expected = legacy_fill_breaks_in_candle_data(transformer, candles.copy())
+
+    filled = transformer.fill_breaks_in_candle_data(candles.copy())
+
+    pd.testing.assert_frame_equal(filled, expected, check_freq=False)
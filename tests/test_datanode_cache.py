@@ -0,0 +1,99 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from sklearn import set_config
+from sklearn.preprocessing import StandardScaler, OneHotEncoder
+
+from engine.schemas.datanode_cache import DataNodeCache
+from engine.schemas.datatypes import Ticker
+from engine.schemas.pipeline import DataNode, datanode_chain
+from engine.transformers.candles_processing import RemoveZeroActivityCandles
+from engine.transformers.returns import Returns, CandlesToDirection
+
+
+# the chains of the train branch of backtest.py, each ending with one of the transformers it uses
+CHAINS = {
+    'remove_zero_activity': lambda: [RemoveZeroActivityCandles()],
+    'returns': lambda: [
+        RemoveZeroActivityCandles(),
+        Returns(keep_overnight=False, day_number=False, candle_to_price='close', keep_vol=False),
+    ],
+    'scaler': lambda: [
+        RemoveZeroActivityCandles(),
+        Returns(keep_overnight=False, day_number=False, candle_to_price='close', keep_vol=False),
+        StandardScaler(with_mean=False),
+    ],
+    'direction': lambda: [RemoveZeroActivityCandles(), CandlesToDirection(periods=5)],
+    'onehot': lambda: [
+        RemoveZeroActivityCandles(),
+        CandlesToDirection(periods=5),
+        OneHotEncoder(sparse_output=False),
+    ],
+}
+
+
+# minute candles of a random walk over several days, with a share of them without trades
+def make_candles(n: int = 3000) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    times = pd.date_range('2024-01-03 07:00', periods=n, freq='min', tz='UTC', name='time')
+
+    close = np.round(100 * np.exp(np.cumsum(rng.normal(scale=1e-3, size=n))), 2)
+    open_ = np.round(close * (1 + rng.normal(scale=1e-4, size=n)), 2)
+
+    return pd.DataFrame({
+        'open': open_,
+        'high': np.maximum(open_, close) + 0.02,
+        'low': np.minimum(open_, close) - 0.02,
+        'close': close,
+        'volume': rng.integers(0, 50, size=n).astype(float),
+        'day_number': np.arange(n) // 500,
+    }, index=times)
+
+
+def fit_chain(steps: list, candles: pd.DataFrame) -> pd.DataFrame:
+    return datanode_chain(Ticker(uid='uid', ticker_sign='SBER'), steps).fit(candles, end_date=candles.index[-1])
+
+
+@pytest.fixture
+def cache(monkeypatch, tmp_path):
+    set_config(transform_output='pandas')
+    cache = DataNodeCache(str(tmp_path) + '/')
+    monkeypatch.setattr(DataNode, 'cache', cache)
+
+    return cache
+
+
+@pytest.mark.parametrize('chain', CHAINS.keys())
+def test_extended_run_matches_cold_run(monkeypatch, cache, chain):
+    candles = make_candles()
+
+    monkeypatch.setattr(DataNode, 'cache', None)
+    cold = fit_chain(CHAINS[chain](), candles)
+    monkeypatch.setattr(DataNode, 'cache', cache)
+
+    fit_chain(CHAINS[chain](), candles.iloc[:2000])
+    warm = fit_chain(CHAINS[chain](), candles)
+    hit = fit_chain(CHAINS[chain](), candles)
+
+    pd.testing.assert_frame_equal(warm, cold)
+    pd.testing.assert_frame_equal(hit, cold)
+
+
+def test_extended_run_recomputes_entry_changed_before_its_end(monkeypatch, cache):
+    candles = make_candles()
+
+    monkeypatch.setattr(DataNode, 'cache', None)
+    cold = fit_chain(CHAINS['returns'](), candles)
+    monkeypatch.setattr(DataNode, 'cache', cache)
+
+    final_datanode = datanode_chain(Ticker(uid='uid', ticker_sign='SBER'), CHAINS['returns']())
+    final_datanode.fit(candles.iloc[:2000], end_date=candles.index[1999])
+
+    # a row in the middle of the lookback window, not the last one, differs from what the node computes
+    key = cache.key(final_datanode, candles.index[0])
+    entry = cache.get(key)
+    entry['data'].iloc[-10] += 1
+    cache.put(key, entry['end_date'], entry['data'], entry['transformer'], entry['fit_hash'])
+
+    pd.testing.assert_frame_equal(fit_chain(CHAINS['returns'](), candles), cold)
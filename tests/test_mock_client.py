@@ -0,0 +1,77 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip('tinkoff')
+
+from api.broker_list import t_invest
+from api.tinvest.datatypes import InstrumentType
+from api.tinvest.mock_client import TMockClient
+from engine.schemas.datatypes import Ticker, get_exchange_calendar
+from engine.schemas.enums import SessionPeriod
+
+
+class StockTicker(Ticker):
+    type_instrument = InstrumentType.STOCK
+
+
+# one candle at every minute of [start, end) at which stocks are traded
+def make_candles(start: str, end: str) -> pd.DataFrame:
+    calendar = get_exchange_calendar(t_invest, InstrumentType.STOCK)
+
+    times = pd.date_range(start, end, freq='min', tz='UTC', name='time', inclusive='left')
+    times = times[[calendar.session(t)[0] != SessionPeriod.CLOSED for t in times]]
+
+    close = 250 + np.cumsum(np.random.default_rng(0).normal(scale=0.05, size=len(times)))
+
+    return pd.DataFrame({
+        'open': close,
+        'high': close + 0.1,
+        'low': close - 0.1,
+        'close': close,
+        'volume': np.ones(len(times), dtype=np.int64),
+    }, index=times)
+
+
+# (time, time of the current candle) at every open minute the client steps through until end
+def run_client(ticker: Ticker, start: str, end: str, skip_closed_periods: bool) -> tuple[list, int]:
+    client = TMockClient(
+        period=pd.Timestamp(start).to_pydatetime(),
+        tickers=[ticker],
+        skip_closed_periods=skip_closed_periods
+    )
+
+    steps, n_steps = [], 0
+
+    with client:
+        while client.period.time_period < pd.Timestamp(end):
+            if client.period.instrument_session[InstrumentType.STOCK] != SessionPeriod.CLOSED:
+                steps.append((
+                    client.period.time_period,
+                    client.candle_data[ticker].index[client.last_candles_idx[ticker]]
+                ))
+
+            client.next_period()
+            n_steps += 1
+
+    return steps, n_steps
+
+
+def test_mock_client_skips_closed_weekend(monkeypatch):
+    ticker = StockTicker(uid='uid', ticker_sign='SBER', lot=1, min_price_increment=0.01)
+    candles = make_candles('2024-03-15 20:00', '2024-03-18 08:00')
+
+    monkeypatch.setattr(TMockClient, 'load_candles', classmethod(lambda cls, ticker, start=None, end=None: candles))
+
+    start, end = '2024-03-15 20:40+00:00', '2024-03-18 07:30+00:00'
+    stepped, n_stepped = run_client(ticker, start, end, skip_closed_periods=False)
+    skipped, n_skipped = run_client(ticker, start, end, skip_closed_periods=True)
+
+    assert skipped == stepped
+    # the current candle is the one of the current minute, on both sides of the weekend
+    assert all(time == candle_time for time, candle_time in skipped)
+    assert [time for time, _ in skipped[9:11]] == [pd.Timestamp('2024-03-15 20:49+00:00'),
+                                                    pd.Timestamp('2024-03-18 06:59+00:00')]
+    # each open minute is one step, the whole weekend is another
+    assert n_skipped == len(skipped)
+    assert n_stepped > n_skipped
@@ -0,0 +1,139 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip('tinkoff')
+
+from sklearn import set_config
+from sklearn.linear_model import LogisticRegression
+from sklearn.preprocessing import StandardScaler, OneHotEncoder
+
+from api.broker_list import t_invest
+from api.tinvest.datatypes import InstrumentType
+from api.tinvest.mock_client import TMockClient
+from engine.candles.candles_uploader import LocalTSUploader
+from engine.models.target_processor import TargetProcessorClassifier
+from engine.schemas.datatypes import Ticker, get_exchange_calendar
+from engine.schemas.enums import SessionPeriod
+from engine.schemas.pipeline import TSPipeline, DataNodeUnion
+from engine.strategies.state_based import AvgState
+from engine.strategies.vectorized import VectorizedAvgState
+from engine.trading_interface import TradingInterface
+from engine.transformers.candles_processing import RemoveZeroActivityCandles
+from engine.transformers.returns import Returns, CandlesToDirection
+from engine.walk_forward import predict_states
+
+
+class StockTicker(Ticker):
+    type_instrument = InstrumentType.STOCK
+
+
+# keeps the clients it is entered as, for their cash after the event loop
+class RecordingClient(TMockClient):
+    clients = []
+
+    def __enter__(self):
+        RecordingClient.clients.append(self)
+
+        return super().__enter__()
+
+
+# a random walk with one candle at every minute of [start, end) at which stocks are traded, days enumerated
+def make_candles(start: str, end: str) -> pd.DataFrame:
+    calendar = get_exchange_calendar(t_invest, InstrumentType.STOCK)
+    rng = np.random.default_rng(0)
+
+    times = pd.date_range(start, end, freq='min', tz='UTC', name='time', inclusive='left')
+    times = times[[calendar.session(t)[0] != SessionPeriod.CLOSED for t in times]]
+
+    close = np.round(250 * np.exp(np.cumsum(rng.normal(scale=1e-3, size=len(times)))), 2)
+    open_ = np.round(close * (1 + rng.normal(scale=1e-4, size=len(times))), 2)
+
+    return pd.DataFrame({
+        'open': open_,
+        'high': np.round(np.maximum(open_, close) + np.abs(rng.normal(scale=0.05, size=len(times))), 2),
+        'low': np.round(np.minimum(open_, close) - np.abs(rng.normal(scale=0.05, size=len(times))), 2),
+        'close': close,
+        'volume': rng.integers(0, 50, size=len(times)),
+        'day_number': pd.factorize(times.normalize())[0],
+    }, index=times)
+
+
+def fit_snapshot(ticker: Ticker, candles: pd.DataFrame, path: str):
+    waiting_period = 5
+    columns = ['returns'] + [f'onehot_direction_{waiting_period}_{i}' for i in range(3)]
+
+    features = DataNodeUnion(
+        ticker,
+        chains=[
+            [RemoveZeroActivityCandles(),
+             Returns(keep_overnight=False, day_number=False, candle_to_price='close', keep_vol=False),
+             StandardScaler(with_mean=False)],
+            [RemoveZeroActivityCandles(),
+             CandlesToDirection(periods=waiting_period)],
+            [RemoveZeroActivityCandles(),
+             CandlesToDirection(periods=waiting_period),
+             OneHotEncoder(sparse_output=False)],
+        ],
+        prefixes=[None, None, 'onehot_']
+    )
+    model = TargetProcessorClassifier(
+        target_name=f'direction_{waiting_period}',
+        estimator=LogisticRegression(max_iter=200),
+        max_lag_columns={column: 10 + waiting_period for column in columns},
+        min_lag_columns={column: waiting_period for column in columns},
+        remainder='drop',
+        classes_name={0: 'calm', 1: 'bull', 2: 'bear'}
+    )
+
+    pipeline = TSPipeline([('features', features), ('model', model)], fit_date=candles.index[-1])
+    pipeline.fit(candles)
+    pipeline.save(path)
+
+
+def test_vectorized_backtest_matches_event_loop(monkeypatch, tmp_path):
+    set_config(transform_output='pandas')
+    monkeypatch.setattr(LocalTSUploader, 'broker', t_invest)
+    monkeypatch.setattr('engine.strategies.strategy.log_path', str(tmp_path) + '/')
+
+    ticker = StockTicker(uid='uid', ticker_sign='SBER', lot=1, min_price_increment=0.01)
+    candles = make_candles('2024-03-11 07:00', '2024-03-14 07:30')
+
+    monkeypatch.setattr(TMockClient, 'load_candles', classmethod(lambda cls, ticker, start=None, end=None: candles))
+
+    train_date = pd.Timestamp('2024-03-12 15:00+00:00')
+    path = str(tmp_path) + '/models/'
+    fit_snapshot(ticker, candles[candles.index <= train_date], path)
+
+    config = {
+        'period': (train_date + pd.Timedelta(minutes=1)).to_pydatetime(),
+        'bid_orderbook_price': 'open',
+        'ask_orderbook_price': 'open',
+        'market_order_price': 'open',
+        'buy_price_end_period': 'low',
+        'sell_price_end_period': 'high',
+        'lag_in_cached_candles': 1,
+        'skip_closed_periods': True,
+    }
+    # through the last candle, at which the strategy sees the fills of the one before
+    duration = candles.index[-1] + pd.Timedelta(minutes=1) - config['period']
+
+    strategy = AvgState(path_to_model=path, cash_share=0.9, num_of_averaging=1)
+    monkeypatch.setattr(RecordingClient, 'clients', [])
+
+    TradingInterface(account=None, strategies=[strategy], duration=duration).launch(
+        client_constructor=RecordingClient,
+        client_config=config | {'tickers': [ticker]},
+        tickers_collection=[ticker]
+    )
+
+    # the candles the event loop feeds the strategy, from the current one at the first period on
+    backtest_candles = candles.iloc[(candles.index <= config['period']).argmin() - 1:]
+    states = predict_states(TSPipeline(path=path, train_split_date=train_date), backtest_candles)
+
+    vectorized = VectorizedAvgState(client_constructor=TMockClient, client_config=config, cash_share=0.9)
+    trades = vectorized.run(ticker, backtest_candles, states)
+
+    assert len(trades) > 0
+    assert vectorized.profits == strategy.profits
+    assert vectorized.cash == RecordingClient.clients[0]._cash